@@ -1,3 +1,8 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
@@ -11,15 +16,56 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'chalboo-secret-key-change-in-producti
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 2 * 24 * 7
 
+# "jose" (python-jose) or "pyjwt"; PyJWT verifies HS256 tokens noticeably
+# faster. Tokens are interchangeable between the two.
+JWT_BACKEND = os.environ.get('JWT_BACKEND', 'pyjwt')
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+
+# bcrypt takes ~100-300 ms of CPU per call, so the async handlers run it on
+# a small thread pool (the bcrypt extension releases the GIL) instead of the
+# event loop. At most PASSWORD_HASH_WORKERS run at once; beyond that up to
+# PASSWORD_HASH_MAX_QUEUE callers wait, and the rest get a 503.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '64'))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+_hash_waiting = 0
+
+_secret_key_bytes = SECRET_KEY.encode()
+# sha256(token) -> (exp timestamp, payload) for tokens that already passed
+# signature and expiry checks.
+_token_cache = OrderedDict()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def _run_hashing(func, *args):
+    global _hash_waiting
+    if _hash_waiting >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent sign-ins, please retry"
+        )
+    _hash_waiting += 1
+    try:
+        async with _hash_slots:
+            return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_waiting -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -30,16 +76,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+if JWT_BACKEND == 'pyjwt':
+    import jwt as pyjwt
+
+    def _verify_token(token: str) -> dict:
+        try:
+            return pyjwt.decode(token, _secret_key_bytes, algorithms=[ALGORITHM])
+        except pyjwt.PyJWTError:
+            raise JWTError("Invalid token")
+else:
+    def _verify_token(token: str) -> dict:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
 def decode_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    cached = _token_cache.get(key)
+    if cached and cached[0] > time.time():
+        _token_cache.move_to_end(key)
+        return dict(cached[1])
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        payload = _verify_token(token)
     except JWTError:
+        _token_cache.pop(key, None)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
 
+    if isinstance(payload.get("exp"), (int, float)):
+        _token_cache[key] = (payload["exp"], payload)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return dict(payload)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_token(token)
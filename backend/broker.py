@@ -0,0 +1,135 @@
+"""Chat fan-out between app workers.
+
+ConnectionManager publishes every group message, already serialized to
+JSON, to a broker and delivers whatever the broker hands back to the
+sockets connected to this process.
+With a single worker the in-memory broker is enough; with several uvicorn
+workers or nodes set CHAT_BROKER_URL=redis://... so a message published on
+one worker reaches members connected to the others.
+
+If the Redis subscription drops, RedisBroker resubscribes with backoff and
+then calls on_reconnect(): whatever was published in between never reached
+this worker, so its sockets have to catch up.
+"""
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "chalboo:group:"
+RECONNECT_BASE_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class MemoryHub:
+    """In-process stand-in for a pub/sub server.
+
+    Brokers sharing one hub behave like workers sharing one Redis, which is
+    what tests and local benchmarks use to exercise cross-worker fan-out.
+    """
+
+    def __init__(self):
+        self.subscribers = []
+
+    async def publish(self, group_id: str, payload: str):
+        for handler in list(self.subscribers):
+            await handler(group_id, payload)
+
+
+class MemoryBroker:
+    def __init__(self, hub: MemoryHub = None):
+        self.hub = hub or MemoryHub()
+        self.handler = None
+        self.failures = 0
+
+    async def start(self, handler, on_reconnect=None):
+        self.handler = handler
+        self.hub.subscribers.append(handler)
+
+    async def publish(self, group_id: str, payload: str):
+        await self.hub.publish(group_id, payload)
+
+    async def stop(self):
+        if self.handler in self.hub.subscribers:
+            self.hub.subscribers.remove(self.handler)
+        self.handler = None
+
+
+class RedisBroker:
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CHAT_BROKER_URL points at Redis but the 'redis' package is not installed")
+
+        self.redis = redis.from_url(url)
+        self.pubsub = None
+        self.reader = None
+        self.failures = 0
+
+    async def start(self, handler, on_reconnect=None):
+        await self._subscribe()
+        self.reader = asyncio.create_task(self._read(handler, on_reconnect))
+
+    async def _subscribe(self):
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.psubscribe(CHANNEL_PREFIX + "*")
+
+    async def _close_pubsub(self):
+        if self.pubsub:
+            try:
+                await self.pubsub.aclose()
+            except Exception:
+                pass
+            self.pubsub = None
+
+    async def _read(self, handler, on_reconnect):
+        delay = RECONNECT_BASE_SECONDS
+        while True:
+            try:
+                if self.pubsub is None:
+                    await self._subscribe()
+                    logger.info("Chat broker resubscribed")
+                    delay = RECONNECT_BASE_SECONDS
+                    if on_reconnect:
+                        await on_reconnect()
+                async for item in self.pubsub.listen():
+                    if item["type"] != "pmessage":
+                        continue
+                    channel = item["channel"].decode()
+                    try:
+                        await handler(channel[len(CHANNEL_PREFIX):], item["data"].decode())
+                    except Exception as e:
+                        logger.error(f"Chat broker delivery error: {e}")
+                raise ConnectionError("subscription ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Chat broker subscription lost, retrying in {delay:.1f}s: {e!r}")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    async def publish(self, group_id: str, payload: str):
+        await self.redis.publish(CHANNEL_PREFIX + group_id, payload)
+
+    async def stop(self):
+        if self.reader:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+        await self._close_pubsub()
+        await self.redis.aclose()
+
+
+def create_broker(url: str = None):
+    url = url if url is not None else os.environ.get("CHAT_BROKER_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    if url:
+        raise RuntimeError(f"Unsupported CHAT_BROKER_URL: {url}")
+    return MemoryBroker()
@@ -0,0 +1,91 @@
+"""Conversion between API models and stored MongoDB documents.
+
+Dates are stored as native BSON datetimes (the client is opened with
+tz_aware=True, so they come back as aware UTC datetimes) and need no
+per-document conversion on read. Documents written before this module
+stored them as ISO strings; run this module directly to convert those in
+place:
+
+    python codec.py
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 1000
+
+DATE_FIELDS = {
+    "users": ("created_at",),
+    "travel_groups": ("travel_date", "created_at"),
+    "join_requests": ("created_at",),
+    "messages": ("created_at",),
+    "ratings": ("created_at",),
+}
+
+
+def to_document(model: BaseModel) -> dict:
+    """Dump a model for insertion, keeping datetimes as native values."""
+    return model.model_dump()
+
+
+def _parse_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_string_dates(db) -> dict:
+    """Convert ISO-string date fields to native datetimes in batches.
+
+    Only documents that still hold a string are touched, so the migration
+    can be interrupted and re-run. Returns the number of fields converted
+    per collection.
+    """
+    converted = {}
+    for collection_name, fields in DATE_FIELDS.items():
+        collection = db[collection_name]
+        count = 0
+        for field in fields:
+            while True:
+                docs = await collection.find(
+                    {field: {"$type": "string"}},
+                    {"_id": 1, field: 1}
+                ).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+                if not docs:
+                    break
+
+                await collection.bulk_write([
+                    UpdateOne({"_id": doc["_id"]}, {"$set": {field: _parse_date(doc[field])}})
+                    for doc in docs
+                ], ordered=False)
+                count += len(docs)
+
+        converted[collection_name] = count
+        logger.info(f"Converted {count} date fields in {collection_name}")
+
+    return converted
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        await migrate_string_dates(client[os.environ['DB_NAME']])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
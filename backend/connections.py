@@ -0,0 +1,402 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE_SIZE = int(os.environ.get("CHAT_SEND_QUEUE_SIZE", "100"))
+SEND_TIMEOUT_SECONDS = float(os.environ.get("CHAT_SEND_TIMEOUT_SECONDS", "5"))
+# What to do when a client's outbound queue is full: "disconnect" closes the
+# slow socket so the client reconnects and catches up, "drop" discards the
+# oldest queued message and keeps the socket.
+SLOW_CONSUMER_POLICY = os.environ.get("CHAT_SLOW_CONSUMER_POLICY", "disconnect")
+
+# 1013 "Try Again Later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# 1008 "Policy Violation": the user is no longer a member of the group.
+REVOKED_CLOSE_CODE = 1008
+# The same user opened a newer socket for the group (reconnect or second
+# tab); clients should not reconnect on it, or two tabs would take turns.
+REPLACED_CLOSE_CODE = 4000
+
+# Membership control frames kept so connect() can apply the ones that
+# arrived while the caller was reading the member list.
+CONTROL_LOG_SIZE = int(os.environ.get("CHAT_CONTROL_LOG_SIZE", "10000"))
+
+# Recent messages kept per group so a reconnecting client can be sent only
+# what it missed. Older gaps are loaded from the store, up to MAX_REPLAY;
+# beyond that the client is told to resync over REST instead.
+RESUME_BUFFER_SIZE = int(os.environ.get("CHAT_RESUME_BUFFER_SIZE", "200"))
+RESUME_BUFFER_GROUPS = int(os.environ.get("CHAT_RESUME_BUFFER_GROUPS", "1000"))
+MAX_REPLAY = int(os.environ.get("CHAT_MAX_REPLAY", "500"))
+
+RESYNC_PAYLOAD = json.dumps({"type": "resync"})
+
+
+class ChatMetrics:
+    def __init__(self):
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.messages_replayed = 0
+        self.resyncs = 0
+        self.connections_evicted = 0
+        self.connections_revoked = 0
+        self.send_count = 0
+        self.send_seconds_total = 0.0
+        self.send_seconds_max = 0.0
+
+    def observe_send(self, seconds: float):
+        self.send_count += 1
+        self.send_seconds_total += seconds
+        self.send_seconds_max = max(self.send_seconds_max, seconds)
+
+    def snapshot(self, queue_depths: dict) -> dict:
+        return {
+            "messages_received": self.messages_received,
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+            "messages_replayed": self.messages_replayed,
+            "resyncs": self.resyncs,
+            "connections_evicted": self.connections_evicted,
+            "connections_revoked": self.connections_revoked,
+            "send_latency_avg_ms": (self.send_seconds_total / self.send_count * 1000) if self.send_count else 0.0,
+            "send_latency_max_ms": self.send_seconds_max * 1000,
+            "queue_depth_total": sum(queue_depths.values()),
+            "queue_depth_max": max(queue_depths.values(), default=0),
+        }
+
+
+class ClientConnection:
+    """One socket plus its bounded outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, group_id: str, user_id: str):
+        self.websocket = websocket
+        self.group_id = group_id
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.writer = None
+        # Sent before anything from the queue; live messages already in it
+        # are skipped.
+        self.replay = []
+        self.replayed = set()
+
+
+class ConnectionManager:
+    """Websocket connections held by this worker, grouped by travel group.
+
+    broadcast() goes through the broker so every worker's deliver() runs,
+    and each worker only writes to its own sockets. deliver() never waits on
+    a socket: the payload is serialized once and queued per connection, and
+    each connection's writer task sends with a timeout, so one slow or dead
+    client cannot hold up the rest of the group.
+
+    deliver() also records every group's recent messages, so a client that
+    reconnects with the id of the last message it saw is replayed only the
+    ones it missed before live delivery resumes.
+
+    For groups with sockets on this worker the member ids are kept in
+    memory, so each incoming chat message is authorized without a read.
+    Handlers that change membership publish a control frame through the
+    broker; every worker updates its index from it and closes the sockets
+    of users who were removed.
+    """
+
+    def __init__(self, broker):
+        self.active_connections: dict = {}
+        self.broker = broker
+        self.metrics = ChatMetrics()
+        self.recent = OrderedDict()
+        self.members: dict = {}
+        self.control_log = deque(maxlen=CONTROL_LOG_SIZE)
+        self.control_count = 0
+        self._closing = set()
+
+    async def start(self):
+        await self.broker.start(self.deliver, on_reconnect=self.broker_reconnected)
+
+    async def stop(self):
+        await self.broker.stop()
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections.values()):
+                self._discard(connection)
+
+    async def broker_reconnected(self):
+        """Close every socket after the broker lost its subscription.
+
+        Messages and membership changes published meanwhile never reached
+        this worker. Reconnecting clients get the missed messages replayed
+        from the store and their membership read again.
+        """
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections.values()):
+                self._evict(connection, SLOW_CONSUMER_CLOSE_CODE)
+
+    def is_member(self, group_id: str, user_id: str) -> bool:
+        return user_id in self.members.get(group_id, ())
+
+    def control_mark(self) -> int:
+        """Position in the control frame log, taken before reading members."""
+        return self.control_count
+
+    async def connect(self, websocket: WebSocket, group_id: str, user_id: str,
+                      members=(), members_as_of: int = None, last_seen: str = None,
+                      load_missed=None, greeting: str = None):
+        """Register a socket, replaying what it missed after `last_seen`.
+
+        Returns the ClientConnection to pass to disconnect(), or None if
+        the socket was closed instead of registered.
+
+        `members` is the group's member list as read by the caller, which
+        has checked that user_id is in it; it seeds the membership index
+        when this is the group's first socket. `members_as_of` is
+        control_mark() from before that read: membership changes published
+        since then are applied on top, so a removal that lands in between is
+        not lost. `greeting`, if given, is sent before anything else.
+
+        load_missed(group_id, last_seen, limit) is awaited when last_seen is
+        older than the buffer. It returns [(message_id, payload), ...] from
+        the store, or None if the gap cannot be replayed.
+        """
+        await websocket.accept()
+        connection = ClientConnection(websocket, group_id, user_id)
+
+        # No await from here until the connection is registered, so no
+        # control frame can slip between the catch-up and the live index.
+        index = self.members.get(group_id)
+        fresh = index is None
+        if fresh:
+            index = set(members)
+        is_member = True
+        if members_as_of is not None:
+            events = self._controls_since(group_id, members_as_of)
+            if events is None:
+                logger.warning(f"Control log does not reach back far enough for {user_id} in {group_id}")
+                await self._close(websocket, SLOW_CONSUMER_CLOSE_CODE)
+                return None
+            for event in events:
+                if event["type"] == "group_deleted":
+                    is_member = False
+                    index.clear()
+                elif event["user_id"] == user_id:
+                    is_member = event["type"] == "member_added"
+                elif fresh and event["type"] == "member_added":
+                    index.add(event["user_id"])
+                elif fresh:
+                    index.discard(event["user_id"])
+        if not is_member:
+            self.metrics.connections_revoked += 1
+            await self._close(websocket, REVOKED_CLOSE_CODE)
+            return None
+
+        previous = self.active_connections.get(group_id, {}).get(user_id)
+        if previous:
+            self._discard(previous)
+            self._schedule_close(previous.websocket, REPLACED_CLOSE_CODE)
+        self.active_connections.setdefault(group_id, {})[user_id] = connection
+        self.members[group_id] = index
+        index.add(user_id)
+
+        if last_seen:
+            # No await between registering and reading the buffer: every
+            # message is either in this snapshot or will reach the queue.
+            buffered = list(self.recent.get(group_id, ()))
+            missed = self._missed_from_buffer(buffered, last_seen)
+            if missed is None:
+                missed = await self._load_missed(group_id, last_seen, buffered, load_missed)
+            if missed is None:
+                self.metrics.resyncs += 1
+                connection.replay = [(None, RESYNC_PAYLOAD)]
+            else:
+                self.metrics.messages_replayed += len(missed)
+                connection.replay = missed
+                connection.replayed = {message_id for message_id, _ in missed}
+
+        if greeting:
+            connection.replay.insert(0, (None, greeting))
+        connection.writer = asyncio.create_task(self._write(connection))
+        return connection
+
+    def _controls_since(self, group_id: str, mark: int):
+        """This group's control frames after `mark`, oldest first.
+
+        None if frames after `mark` have already fallen out of the log.
+        """
+        events = []
+        for count, event_group_id, event in reversed(self.control_log):
+            if count <= mark:
+                break
+            if event_group_id == group_id:
+                events.append(event)
+        else:
+            if self.control_log and self.control_log[0][0] > mark + 1:
+                return None
+        events.reverse()
+        return events
+
+    def _missed_from_buffer(self, buffered: list, last_seen: str):
+        for index, (message_id, _) in enumerate(buffered):
+            if message_id == last_seen:
+                return buffered[index + 1:]
+        return None
+
+    async def _load_missed(self, group_id: str, last_seen: str, buffered: list, load_missed):
+        if load_missed is None:
+            return None
+        try:
+            stored = await load_missed(group_id, last_seen, MAX_REPLAY)
+        except Exception as e:
+            logger.error(f"Failed to load missed messages for {group_id}: {e}")
+            return None
+        if stored is None:
+            return None
+        # Buffered messages may not have been flushed to the store yet.
+        stored_ids = {message_id for message_id, _ in stored}
+        return stored + [entry for entry in buffered if entry[0] not in stored_ids]
+
+    def _remember(self, group_id: str, message_id: str, payload: str):
+        recent = self.recent.get(group_id)
+        if recent is None:
+            recent = self.recent[group_id] = deque(maxlen=RESUME_BUFFER_SIZE)
+            while len(self.recent) > RESUME_BUFFER_GROUPS:
+                self.recent.popitem(last=False)
+        else:
+            self.recent.move_to_end(group_id)
+        recent.append((message_id, payload))
+
+    def disconnect(self, connection: ClientConnection):
+        """Unregister `connection` if it is still the user's current one."""
+        self._discard(connection)
+
+    def _discard(self, connection: ClientConnection):
+        connections = self.active_connections.get(connection.group_id)
+        if connections and connections.get(connection.user_id) is connection:
+            del connections[connection.user_id]
+            if not connections:
+                del self.active_connections[connection.group_id]
+                self.members.pop(connection.group_id, None)
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    def _evict(self, connection: ClientConnection, code: int = 1011):
+        self.metrics.connections_evicted += 1
+        self._discard(connection)
+        self._schedule_close(connection.websocket, code)
+
+    def _revoke(self, connection: ClientConnection):
+        self.metrics.connections_revoked += 1
+        self._discard(connection)
+        self._schedule_close(connection.websocket, REVOKED_CLOSE_CODE)
+
+    def _schedule_close(self, websocket: WebSocket, code: int):
+        task = asyncio.create_task(self._close(websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _write(self, connection: ClientConnection):
+        for _, payload in connection.replay:
+            if not await self._send(connection, payload):
+                return
+        connection.replay = []
+
+        while True:
+            message_id, payload = await connection.queue.get()
+            if message_id in connection.replayed:
+                continue
+            if not await self._send(connection, payload):
+                return
+
+    async def _send(self, connection: ClientConnection, payload: str) -> bool:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(connection.websocket.send_text(payload), SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Evicting chat connection {connection.user_id} in {connection.group_id}: {e!r}")
+            self._evict(connection)
+            return False
+        self.metrics.observe_send(time.perf_counter() - started)
+        self.metrics.messages_sent += 1
+        return True
+
+    def notify(self, connection: ClientConnection, message: dict):
+        """Queue a frame for this one socket."""
+        try:
+            connection.queue.put_nowait((None, json.dumps(message)))
+        except asyncio.QueueFull:
+            self.metrics.messages_dropped += 1
+
+    async def broadcast(self, group_id: str, message: dict):
+        await self.broker.publish(group_id, json.dumps(message))
+
+    async def membership_changed(self, group_id: str, user_id: str, is_member: bool):
+        await self.broker.publish(group_id, json.dumps(
+            {"type": "member_added" if is_member else "member_removed", "user_id": user_id}
+        ))
+
+    async def group_deleted(self, group_id: str):
+        await self.broker.publish(group_id, json.dumps({"type": "group_deleted"}))
+
+    def _apply_control(self, group_id: str, event: dict):
+        connections = self.active_connections.get(group_id, {})
+        if event["type"] == "member_added":
+            if group_id in self.members:
+                self.members[group_id].add(event["user_id"])
+        elif event["type"] == "member_removed":
+            if group_id in self.members:
+                self.members[group_id].discard(event["user_id"])
+            connection = connections.get(event["user_id"])
+            if connection:
+                self._revoke(connection)
+        elif event["type"] == "group_deleted":
+            for connection in list(connections.values()):
+                self._revoke(connection)
+            self.members.pop(group_id, None)
+            self.recent.pop(group_id, None)
+
+    async def deliver(self, group_id: str, payload: str):
+        message = json.loads(payload)
+        if "type" in message:
+            self.control_count += 1
+            self.control_log.append((self.control_count, group_id, message))
+            self._apply_control(group_id, message)
+            return
+
+        self.metrics.messages_received += 1
+        message_id = message.get("id")
+        self._remember(group_id, message_id, payload)
+        entry = (message_id, payload)
+        for connection in list(self.active_connections.get(group_id, {}).values()):
+            try:
+                connection.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                self.metrics.messages_dropped += 1
+                if SLOW_CONSUMER_POLICY == "drop":
+                    connection.queue.get_nowait()
+                    connection.queue.put_nowait(entry)
+                else:
+                    self._evict(connection, SLOW_CONSUMER_CLOSE_CODE)
+
+    def queue_depths(self) -> dict:
+        return {
+            (group_id, user_id): connection.queue.qsize()
+            for group_id, connections in self.active_connections.items()
+            for user_id, connection in connections.items()
+        }
+
+    def stats(self) -> dict:
+        stats = self.metrics.snapshot(self.queue_depths())
+        stats["broker_failures"] = self.broker.failures
+        return stats
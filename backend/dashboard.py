@@ -0,0 +1,95 @@
+"""Everything the My Groups page shows, in one aggregation.
+
+One pipeline over the user's groups (served by the members index) looks up,
+per group, the pending join request count, the user's read marker and the
+latest message; message and unread counts come from the group's last_seq
+(see read_state.py). Each $lookup uses localField/foreignField together
+with a sub-pipeline, which needs MongoDB 5.0+, and is served by the
+group_id indexes on join_requests, read_markers and messages.
+
+Join requests are only counted for groups the user administers: the
+lookup joins on admin_group_id, which is null for the others and so
+matches nothing. On an older server the My Groups page falls back to the
+plain /my-groups list.
+"""
+from pymongo import DESCENDING
+
+from pagination import encode_cursor, page_query
+from read_state import unread_count
+
+LAST_MESSAGE_FIELDS = {"_id": 0, "id": 1, "sender_id": 1, "sender_name": 1, "content": 1, "seq": 1, "created_at": 1}
+
+
+def dashboard_pipeline(user_id: str, limit: int, cursor: str, projection: dict) -> list:
+    return [
+        {"$match": page_query({"members": user_id}, cursor)},
+        {"$sort": {"created_at": DESCENDING, "id": DESCENDING}},
+        {"$limit": limit + 1},
+        {"$project": projection},
+        {"$addFields": {
+            "admin_group_id": {"$cond": [{"$eq": ["$admin_id", user_id]}, "$id", None]},
+        }},
+        {"$lookup": {
+            "from": "join_requests",
+            "localField": "admin_group_id",
+            "foreignField": "group_id",
+            "pipeline": [{"$match": {"status": "pending"}}, {"$count": "count"}],
+            "as": "pending",
+        }},
+        {"$lookup": {
+            "from": "read_markers",
+            "localField": "id",
+            "foreignField": "group_id",
+            "pipeline": [{"$match": {"user_id": user_id}}, {"$project": {"_id": 0, "last_read_seq": 1}}],
+            "as": "read_marker",
+        }},
+        {"$lookup": {
+            "from": "messages",
+            "localField": "id",
+            "foreignField": "group_id",
+            "pipeline": [
+                {"$sort": {"created_at": DESCENDING, "id": DESCENDING}},
+                {"$limit": 1},
+                {"$project": LAST_MESSAGE_FIELDS},
+            ],
+            "as": "last_message",
+        }},
+    ]
+
+
+async def load_dashboard(db, user_id: str, limit: int, cursor: str = None, projection: dict = None):
+    """Returns (rows, next_cursor); see dashboard_rows."""
+    projection = projection or {"_id": 0}
+    docs = await db.travel_groups.aggregate(
+        dashboard_pipeline(user_id, limit, cursor, projection)
+    ).to_list(limit + 1)
+    return dashboard_rows(docs, user_id, limit)
+
+
+def dashboard_rows(docs: list, user_id: str, limit: int):
+    """Turn dashboard_pipeline output into (rows, next_cursor).
+
+    Each row is {"group", "pending_requests", "message_count", "unread_count",
+    "last_message"}; pending_requests is None for groups the user does not
+    administer.
+    """
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+
+    rows = []
+    for group in docs:
+        group.pop("admin_group_id")
+        pending = group.pop("pending")
+        read_marker = group.pop("read_marker")
+        last_message = group.pop("last_message")
+        last_read_seq = read_marker[0]["last_read_seq"] if read_marker else 0
+        rows.append({
+            "group": group,
+            "pending_requests": (pending[0]["count"] if pending else 0) if group["admin_id"] == user_id else None,
+            "message_count": group.get("last_seq", 0),
+            "unread_count": unread_count(group.get("last_seq", 0), last_read_seq),
+            "last_message": last_message[0] if last_message else None,
+        })
+    return rows, next_cursor
@@ -0,0 +1,67 @@
+"""Streaming NDJSON export of a group's chat history.
+
+The Motor cursor is read in batches of EXPORT_BATCH_SIZE and each batch is
+encoded and sent before the next is fetched, so memory stays flat however
+long the history is. Messages come out in seq order. For incremental sync
+a client passes the seq of the last line it received as `after_seq` and
+gets only later messages.
+
+Messages are stored write-behind, and from several workers, so a message
+can land after higher seqs are already stored. MessageWriter stores a
+message within FLUSH_DEADLINE_SECONDS of its created_at or drops it, so a
+missing seq can only still turn up while the message after the gap is
+younger than that (plus EXPORT_CLOCK_SKEW_SECONDS between workers). The
+export stops at the first such gap; an older gap is a dropped message and
+is skipped. Every seq up to the last line is then stored, or it never will
+be. The rest comes with the next sync.
+"""
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING
+
+from message_writer import FLUSH_DEADLINE_SECONDS
+
+EXPORT_BATCH_SIZE = int(os.environ.get("CHAT_EXPORT_BATCH_SIZE", "500"))
+EXPORT_CLOCK_SKEW_SECONDS = float(os.environ.get("CHAT_EXPORT_CLOCK_SKEW_SECONDS", "5"))
+EXPORT_SETTLE_SECONDS = FLUSH_DEADLINE_SECONDS + EXPORT_CLOCK_SKEW_SECONDS
+
+
+def settle_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+
+
+async def iter_ndjson(collection, query: dict, serializer, batch_size: int = EXPORT_BATCH_SIZE,
+                      after_seq: int = 0, settled_before: datetime = None):
+    """Encode messages in seq order.
+
+    With `settled_before`, stops at the first seq gap whose next message
+    was created after it, since the missing one may still be stored.
+    """
+    cursor = collection.find(query, serializer.projection).sort(
+        [("seq", ASCENDING)]
+    ).batch_size(batch_size)
+
+    batch = []
+    expected = after_seq + 1
+    async for doc in cursor:
+        if settled_before and doc["seq"] != expected and doc["created_at"] > settled_before:
+            break
+        expected = doc["seq"] + 1
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield serializer.dump_lines(batch)
+            batch = []
+    if batch:
+        yield serializer.dump_lines(batch)
+
+
+async def gzip_chunks(chunks):
+    # wbits=31 writes a gzip header and trailer around the deflate stream.
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,146 @@
+"""Background cascade for deleted travel groups.
+
+delete_group removes the group document right away (so the group vanishes
+from every read) after recording a job in `group_deletions`. This worker
+then deletes the group's join requests, messages and read markers in
+bounded batches,
+recording progress on the job after each batch. Jobs are claimed with a
+lease, so a job left behind by a crashed worker is picked up again once
+its lease expires and continues from where it stopped.
+
+Messages and read receipts are stored write-behind. The worker that
+deletes the group discards its own queued ones, but other workers may
+still store theirs: a message within FLUSH_DEADLINE_SECONDS of being
+sent (see message_writer.py). A job therefore waits CASCADE_DELAY_SECONDS
+before it is claimed, so the cascade runs after the last of them lands.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from message_writer import FLUSH_DEADLINE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = int(os.environ.get("GROUP_DELETE_BATCH_SIZE", "1000"))
+POLL_INTERVAL_SECONDS = float(os.environ.get("GROUP_DELETE_POLL_SECONDS", "30"))
+LEASE_SECONDS = 60
+CASCADE_DELAY_SECONDS = float(os.environ.get("GROUP_DELETE_DELAY_SECONDS", str(FLUSH_DEADLINE_SECONDS + 15)))
+
+CASCADE_COLLECTIONS = ("join_requests", "messages", "read_markers")
+
+
+async def schedule_group_deletion(db, group: dict) -> dict:
+    now = datetime.now(timezone.utc)
+    job = {
+        "id": str(uuid.uuid4()),
+        "group_id": group["id"],
+        "admin_id": group["admin_id"],
+        "status": "pending",
+        "deleted": {name: 0 for name in CASCADE_COLLECTIONS},
+        "lease_until": None,
+        "created_at": now,
+        "not_before": now + timedelta(seconds=CASCADE_DELAY_SECONDS),
+        "finished_at": None,
+    }
+    await db.group_deletions.insert_one(job)
+    await db.travel_groups.delete_one({"id": group["id"]})
+    job.pop("_id", None)
+    return job
+
+
+class GroupDeletionWorker:
+    def __init__(self, db):
+        self.db = db
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.worker_id = str(uuid.uuid4())
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                while await self.run_next():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Group deletion worker error: {e}")
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def _claim(self):
+        now = datetime.now(timezone.utc)
+        return await self.db.group_deletions.find_one_and_update(
+            {
+                "status": {"$in": ["pending", "running"]},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+                # Jobs recorded before not_before existed have none.
+                "not_before": {"$not": {"$gt": now}},
+            },
+            {"$set": {
+                "status": "running",
+                "worker_id": self.worker_id,
+                "lease_until": now + timedelta(seconds=LEASE_SECONDS),
+            }},
+            projection={"id": 1, "group_id": 1},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def run_next(self) -> bool:
+        """Process one job to completion. Returns False if none was waiting."""
+        job = await self._claim()
+        if not job:
+            return False
+
+        group_id = job["group_id"]
+        # Covers a crash between recording the job and removing the group.
+        await self.db.travel_groups.delete_one({"id": group_id})
+
+        for name in CASCADE_COLLECTIONS:
+            collection = self.db[name]
+            while True:
+                batch = await collection.find(
+                    {"group_id": group_id}, {"_id": 1}
+                ).limit(DELETE_BATCH_SIZE).to_list(DELETE_BATCH_SIZE)
+                if not batch:
+                    break
+
+                result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                await self.db.group_deletions.update_one(
+                    {"id": job["id"]},
+                    {
+                        "$inc": {f"deleted.{name}": result.deleted_count},
+                        "$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)},
+                    }
+                )
+
+        await self.db.group_deletions.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "done", "lease_until": None, "finished_at": datetime.now(timezone.utc)}}
+        )
+        logger.info(f"Finished cascade delete of group {group_id}")
+        return True
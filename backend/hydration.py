@@ -0,0 +1,40 @@
+# What the UI renders next to a join request, rating or member row.
+PUBLIC_PROFILE_FIELDS = ("id", "name", "city", "age", "average_rating", "total_ratings")
+# A whole user document minus what never leaves the server: the password
+# hash and the running rating sum behind average_rating.
+PRIVATE_USER_PROJECTION = {"_id": 0, "password": 0, "rating_sum": 0}
+
+
+def _projection(fields):
+    if fields is None:
+        return PRIVATE_USER_PROJECTION
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    return projection
+
+
+async def fetch_users(db, user_ids, fields=PUBLIC_PROFILE_FIELDS) -> dict:
+    """Load every user in `user_ids` with a single $in query, keyed by id.
+
+    Pass fields=None to get the whole document minus private fields.
+    """
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+
+    users = await db.users.find({"id": {"$in": ids}}, _projection(fields)).to_list(len(ids))
+    return {user["id"]: user for user in users}
+
+
+async def attach_users(db, rows, id_field, row_key, user_key, fields=PUBLIC_PROFILE_FIELDS) -> list:
+    """Pair each row with the user referenced by row[id_field].
+
+    Returns [{row_key: row, user_key: user}, ...] in the original order;
+    rows whose user no longer exists are dropped.
+    """
+    users = await fetch_users(db, (row[id_field] for row in rows), fields)
+    return [
+        {row_key: row, user_key: users[row[id_field]]}
+        for row in rows
+        if row[id_field] in users
+    ]
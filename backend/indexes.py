@@ -0,0 +1,132 @@
+import logging
+import time
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# An index with this name exists with different options or keys.
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+
+# collection -> list of (keys, options). Every handler in server.py looks
+# documents up by the app-level "id", so each collection gets a unique index
+# on it in addition to the query-specific ones. List queries end in
+# (created_at, id) so keyset pagination (see pagination.py) is index-only.
+EXPECTED_INDEXES = {
+    "users": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "travel_groups": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("members", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+        ([("created_at", DESCENDING), ("id", DESCENDING)], {}),
+        # Location searches, per sort: search.py queries tokens with $in so
+        # each token's scan comes out in sort order and they can be merged.
+        ([("to_tokens", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+        ([("from_tokens", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+        ([("to_tokens", ASCENDING), ("travel_date", ASCENDING), ("id", ASCENDING)], {}),
+        ([("from_tokens", ASCENDING), ("travel_date", ASCENDING), ("id", ASCENDING)], {}),
+        ([("travel_date", ASCENDING), ("id", ASCENDING)], {}),
+    ],
+    "join_requests": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("group_id", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {}),
+    ],
+    "messages": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("group_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {}),
+        ([("group_id", ASCENDING), ("seq", ASCENDING)], {}),
+    ],
+    "read_markers": [
+        ([("user_id", ASCENDING), ("group_id", ASCENDING)], {"unique": True}),
+        ([("group_id", ASCENDING)], {}),
+    ],
+    "ratings": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("to_user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {}),
+        # One rating per rater, ratee and trip; run `python ratings.py` first
+        # to remove duplicates stored before this was unique.
+        ([("from_user_id", ASCENDING), ("to_user_id", ASCENDING), ("group_id", ASCENDING)], {"unique": True}),
+    ],
+    "group_deletions": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("group_id", ASCENDING), ("admin_id", ASCENDING)], {}),
+        ([("status", ASCENDING), ("created_at", ASCENDING)], {}),
+    ],
+}
+
+
+def _index_name(keys):
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+async def ensure_indexes(db):
+    """Create every index in EXPECTED_INDEXES and verify they all exist.
+
+    create_index is a no-op when an identical index is already present, so
+    this is safe to run on every startup, from every worker at once. An
+    index whose options changed is not rebuilt here: that can fail on
+    existing data, so it is left to the migration that changed it.
+    """
+    conflicts = []
+    for collection_name, specs in EXPECTED_INDEXES.items():
+        collection = db[collection_name]
+        for keys, options in specs:
+            started = time.perf_counter()
+            try:
+                await collection.create_index(keys, name=_index_name(keys), **options)
+            except OperationFailure as e:
+                if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+                    raise
+                conflicts.append(f"{collection_name}.{_index_name(keys)}")
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logger.info(f"Index {collection_name}.{_index_name(keys)} ready in {elapsed_ms:.1f} ms")
+
+    if conflicts:
+        raise RuntimeError(
+            f"MongoDB indexes exist with different options: {', '.join(conflicts)}. "
+            "Run the migration that changed them first (python ratings.py for the ratings index)."
+        )
+    await verify_indexes(db)
+
+
+async def rebuild_index(db, collection_name: str, keys: list, prepare=None) -> bool:
+    """Drop `keys`' index if its options differ from EXPECTED_INDEXES and create it again.
+
+    `prepare` is awaited between the drop and the create, e.g. to clean up
+    documents the new options would reject. Returns whether it was rebuilt.
+    """
+    options = next(options for spec_keys, options in EXPECTED_INDEXES[collection_name] if spec_keys == keys)
+    collection = db[collection_name]
+    name = _index_name(keys)
+    existing = (await collection.index_information()).get(name)
+    if existing and all(existing.get(option, False) == value for option, value in options.items()):
+        return False
+    if existing:
+        logger.warning(f"Rebuilding index {collection_name}.{name} with new options")
+        await collection.drop_index(name)
+    if prepare:
+        await prepare()
+    await collection.create_index(keys, name=name, **options)
+    return True
+
+
+async def verify_indexes(db):
+    missing = []
+    for collection_name, specs in EXPECTED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        existing_keys = {
+            tuple((field, direction) for field, direction in info["key"])
+            for info in existing.values()
+        }
+        for keys, _ in specs:
+            if tuple(keys) not in existing_keys:
+                missing.append(f"{collection_name}.{_index_name(keys)}")
+
+    if missing:
+        raise RuntimeError(f"Missing expected MongoDB indexes: {', '.join(missing)}")
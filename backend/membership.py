@@ -0,0 +1,104 @@
+"""Atomic group membership changes.
+
+Each change is a single conditional find_one_and_update: capacity, admin
+and membership checks live in the filter, so two concurrent approvals can
+never overfill a group. Capacity is checked against the members array
+itself; `member_count` is maintained alongside it for readers. Run this
+module directly to set member_count on groups created before it existed:
+
+    python membership.py
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+_HAS_ROOM = {"$expr": {"$lt": [{"$size": "$members"}, "$max_members"]}}
+_MEMBERSHIP_FIELDS = {"id": 1, "admin_id": 1, "members": 1, "member_count": 1, "max_members": 1}
+
+
+async def add_member(db, group_id: str, admin_id: str, user_id: str) -> dict:
+    """Add user_id to the group if admin_id owns it and it has room.
+
+    Returns the updated membership fields. Raises the same HTTP errors
+    the handlers used to raise from their read-then-write checks.
+    """
+    group = await db.travel_groups.find_one_and_update(
+        {"id": group_id, "admin_id": admin_id, "members": {"$ne": user_id}, **_HAS_ROOM},
+        {"$push": {"members": user_id}, "$inc": {"member_count": 1}},
+        projection=_MEMBERSHIP_FIELDS,
+        return_document=ReturnDocument.AFTER
+    )
+    if group:
+        return group
+
+    # The update matched nothing: read once to report why.
+    group = await db.travel_groups.find_one({"id": group_id}, _MEMBERSHIP_FIELDS)
+    if not group or group["admin_id"] != admin_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if user_id in group["members"]:
+        return group
+    raise HTTPException(status_code=400, detail="Group is full")
+
+
+async def remove_member(db, group_id: str, user_id: str) -> dict:
+    """Remove a non-admin member. Returns the updated membership fields."""
+    group = await db.travel_groups.find_one_and_update(
+        {"id": group_id, "members": user_id, "admin_id": {"$ne": user_id}},
+        {"$pull": {"members": user_id}, "$inc": {"member_count": -1}},
+        projection=_MEMBERSHIP_FIELDS,
+        return_document=ReturnDocument.AFTER
+    )
+    if group:
+        return group
+
+    group = await db.travel_groups.find_one({"id": group_id}, _MEMBERSHIP_FIELDS)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if user_id not in group["members"]:
+        raise HTTPException(status_code=400, detail="You are not a member of this group")
+    raise HTTPException(
+        status_code=400,
+        detail="Admin cannot leave the group. Transfer admin rights first."
+    )
+
+
+async def backfill_member_counts(db) -> int:
+    updated = 0
+    batch = []
+    async for group in db.travel_groups.find({}, {"_id": 0, "id": 1, "members": 1}):
+        batch.append(UpdateOne({"id": group["id"]}, {"$set": {"member_count": len(group["members"])}}))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            await db.travel_groups.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.travel_groups.bulk_write(batch, ordered=False)
+        updated += len(batch)
+
+    logger.info(f"Backfilled member_count for {updated} groups")
+    return updated
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        await backfill_member_counts(client[os.environ['DB_NAME']])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
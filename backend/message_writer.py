@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import pymongo
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = int(os.environ.get("CHAT_FLUSH_BATCH_SIZE", "200"))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("CHAT_FLUSH_INTERVAL_SECONDS", "0.05"))
+MAX_PENDING = int(os.environ.get("CHAT_MAX_PENDING_WRITES", "10000"))
+# "buffered": write() returns as soon as the message is queued.
+# "durable": write() waits until the batch holding the message is stored.
+WRITE_ACK = os.environ.get("CHAT_WRITE_ACK", "buffered")
+# A batch that fails to store goes back to the front of the queue and is
+# retried with exponential backoff; messages still failing after
+# FLUSH_MAX_ATTEMPTS inserts are dropped and counted.
+FLUSH_MAX_ATTEMPTS = int(os.environ.get("CHAT_FLUSH_MAX_ATTEMPTS", "5"))
+FLUSH_RETRY_SECONDS = float(os.environ.get("CHAT_FLUSH_RETRY_SECONDS", "0.5"))
+# A message is stored within this long of its created_at or not at all:
+# older ones are dropped instead of inserted, and each insert_many runs
+# under pymongo.timeout() so a stalled one is abandoned, on the server too,
+# before the deadline. The chat export relies on this bound.
+FLUSH_DEADLINE_SECONDS = float(os.environ.get("CHAT_FLUSH_DEADLINE_SECONDS", "60"))
+
+DUPLICATE_KEY = 11000
+
+
+class MessageWriter:
+    """Write-behind buffer for chat messages.
+
+    The websocket loop broadcasts first and then hands the document here;
+    documents are stored with insert_many once FLUSH_BATCH_SIZE are queued
+    or FLUSH_INTERVAL_SECONDS have passed, whichever comes first. stop()
+    drains whatever is still queued.
+
+    Every client has already seen a queued message, so a failed insert is
+    retried rather than lost. Messages have a unique id index, so a
+    duplicate key error on retry means the earlier attempt stored it.
+    """
+
+    def __init__(self, collection, durable: bool = None):
+        self.collection = collection
+        self.durable = durable if durable is not None else WRITE_ACK == "durable"
+        self.pending = []
+        self.waiters = []
+        self.wakeup = asyncio.Event()
+        self.flushed = asyncio.Condition()
+        self.task = None
+        self.stopping = False
+        # id(doc) -> failed inserts so far, for documents awaiting a retry.
+        self.attempts = {}
+        self.retried = 0
+        self.dropped = 0
+
+    async def start(self):
+        self.stopping = False
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+        if self.task:
+            await self.task
+            self.task = None
+        await self.flush()
+
+    async def write(self, doc: dict):
+        while len(self.pending) >= MAX_PENDING:
+            # Mongo is falling behind: hold this sender until a flush lands.
+            self.wakeup.set()
+            async with self.flushed:
+                await self.flushed.wait()
+
+        self.pending.append(doc)
+        waiter = None
+        if self.durable:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+        if len(self.pending) >= FLUSH_BATCH_SIZE:
+            self.wakeup.set()
+
+        if waiter:
+            await waiter
+
+    def discard_group(self, group_id: str):
+        """Drop queued messages of a group that is being deleted."""
+        keep, keep_waiters = [], []
+        for index, doc in enumerate(self.pending):
+            waiter = self.waiters[index] if self.waiters else None
+            if doc["group_id"] != group_id:
+                keep.append(doc)
+                if waiter:
+                    keep_waiters.append(waiter)
+                continue
+            self.attempts.pop(id(doc), None)
+            if waiter and not waiter.done():
+                waiter.set_result(None)
+        self.pending, self.waiters = keep, keep_waiters
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self.pending:
+            batch, self.pending = self.pending[:FLUSH_BATCH_SIZE], self.pending[FLUSH_BATCH_SIZE:]
+            waiters, self.waiters = self.waiters[:len(batch)], self.waiters[len(batch):]
+            batch, waiters = self._drop_expired(batch, waiters)
+            if not batch:
+                continue
+
+            error, failed = await self._insert(batch)
+            retry, retry_waiters = [], []
+            for index, doc in enumerate(batch):
+                waiter = waiters[index] if waiters else None
+                if index not in failed:
+                    self.attempts.pop(id(doc), None)
+                    if waiter and not waiter.done():
+                        waiter.set_result(None)
+                    continue
+                attempts = self.attempts.pop(id(doc), 0) + 1
+                if attempts < FLUSH_MAX_ATTEMPTS:
+                    self.attempts[id(doc)] = attempts
+                    retry.append(doc)
+                    if waiter:
+                        retry_waiters.append(waiter)
+                else:
+                    self.dropped += 1
+                    if waiter and not waiter.done():
+                        waiter.set_exception(error)
+
+            if retry:
+                self.retried += len(retry)
+                self.pending[:0] = retry
+                self.waiters[:0] = retry_waiters
+            if len(retry) < len(failed):
+                logger.error(f"Dropped {len(failed) - len(retry)} chat messages after {FLUSH_MAX_ATTEMPTS} attempts: {error}")
+
+            async with self.flushed:
+                self.flushed.notify_all()
+
+            if retry:
+                attempts = max(self.attempts[id(doc)] for doc in retry)
+                delay = FLUSH_RETRY_SECONDS * 2 ** (attempts - 1)
+                logger.warning(f"Failed to store {len(retry)} chat messages, retrying in {delay:.1f}s: {error}")
+                await asyncio.sleep(delay)
+
+    def _drop_expired(self, batch: list, waiters: list):
+        """Drop documents past FLUSH_DEADLINE_SECONDS; returns the rest and their waiters."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=FLUSH_DEADLINE_SECONDS)
+        keep, keep_waiters = [], []
+        for index, doc in enumerate(batch):
+            waiter = waiters[index] if waiters else None
+            if doc["created_at"] > cutoff:
+                keep.append(doc)
+                if waiter:
+                    keep_waiters.append(waiter)
+                continue
+            self.attempts.pop(id(doc), None)
+            self.dropped += 1
+            if waiter and not waiter.done():
+                waiter.set_exception(TimeoutError(f"Not stored within {FLUSH_DEADLINE_SECONDS}s"))
+        if len(keep) < len(batch):
+            logger.error(f"Dropped {len(batch) - len(keep)} chat messages not stored within {FLUSH_DEADLINE_SECONDS}s")
+        return keep, keep_waiters
+
+    async def _insert(self, batch: list):
+        """insert_many; returns (error, indexes of documents not stored)."""
+        deadline = min(doc["created_at"] for doc in batch) + timedelta(seconds=FLUSH_DEADLINE_SECONDS)
+        remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+        try:
+            with pymongo.timeout(max(remaining, 0.001)):
+                await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            failed = {
+                write_error["index"] for write_error in e.details.get("writeErrors", [])
+                if write_error.get("code") != DUPLICATE_KEY
+            }
+            if e.details.get("writeConcernErrors"):
+                # Inserted, but not confirmed durable: try them all again.
+                failed = set(range(len(batch)))
+            return e, failed
+        except Exception as e:
+            return e, set(range(len(batch)))
+        return None, set()
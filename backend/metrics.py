@@ -0,0 +1,187 @@
+"""Prometheus instrumentation, served by server.py on GET /metrics.
+
+- MetricsMiddleware times every HTTP request by route template and status.
+- MongoCommandListener times every command Motor sends, per collection and
+  command, and counts the documents each one returned or wrote.
+- ChatCollector reads the websocket ConnectionManager at scrape time:
+  sockets per group, queue depth and the ChatMetrics counters.
+- MessageWriterCollector reports chat messages waiting to be stored and
+  the ones retried or dropped after failed inserts.
+- RateLimitCollector reports the RateLimiter's allowed and rejected
+  counts per rule.
+"""
+import threading
+import time
+
+from pymongo import monitoring
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status",
+    ["method", "route", "status"]
+)
+
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection and command",
+    ["collection", "command"], buckets=MONGO_BUCKETS
+)
+MONGO_DOCUMENTS = Counter(
+    "mongo_command_documents_total", "Documents returned or written by MongoDB commands",
+    ["collection", "command"]
+)
+MONGO_FAILURES = Counter(
+    "mongo_command_failures_total", "MongoDB commands that failed",
+    ["collection", "command"]
+)
+
+
+class MetricsMiddleware:
+    """Records one HTTP_LATENCY sample per HTTP request.
+
+    Requests are labelled with the matched route template, not the raw
+    path, so group and user ids do not each get their own series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"], route.path if route else "unmatched", str(status[0])
+            ).observe(time.perf_counter() - started)
+
+
+def _documents(command_name: str, reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name in ("insert", "update", "delete"):
+        return reply.get("n", 0)
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """pymongo listener; pass it to the client as event_listeners=[...]."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = "none"
+        with self.lock:
+            self.inflight[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event):
+        with self.lock:
+            collection = self.inflight.pop((event.connection_id, event.request_id), "none")
+        return collection
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1_000_000)
+        documents = _documents(event.command_name, event.reply)
+        if documents:
+            MONGO_DOCUMENTS.labels(collection, event.command_name).inc(documents)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1_000_000)
+        MONGO_FAILURES.labels(collection, event.command_name).inc()
+
+
+class ChatCollector:
+    def __init__(self, manager):
+        self.manager = manager
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "chat_connections", "Open chat websockets on this worker by group", labels=["group_id"]
+        )
+        for group_id, sockets in self.manager.active_connections.items():
+            connections.add_metric([group_id], len(sockets))
+        yield connections
+
+        stats = self.manager.stats()
+        yield GaugeMetricFamily(
+            "chat_send_queue_depth", "Messages waiting in chat send queues", value=stats["queue_depth_total"]
+        )
+        for name in ("messages_received", "messages_sent", "messages_dropped", "messages_replayed",
+                     "resyncs", "connections_evicted", "connections_revoked", "broker_failures"):
+            yield CounterMetricFamily(f"chat_{name}", f"Chat {name.replace('_', ' ')}", value=stats[name])
+
+
+class MessageWriterCollector:
+    def __init__(self, writer):
+        self.writer = writer
+
+    def collect(self):
+        yield GaugeMetricFamily(
+            "chat_store_pending", "Chat messages waiting to be stored", value=len(self.writer.pending)
+        )
+        yield CounterMetricFamily(
+            "chat_store_retried", "Chat messages requeued after a failed insert", value=self.writer.retried
+        )
+        yield CounterMetricFamily(
+            "chat_store_dropped", "Chat messages dropped after every insert attempt failed",
+            value=self.writer.dropped
+        )
+
+
+class RateLimitCollector:
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def collect(self):
+        stats = self.limiter.stats()
+        for name in ("allowed", "rejected"):
+            counter = CounterMetricFamily(
+                f"rate_limit_{name}", f"Requests {name} by rate limit rule", labels=["rule"]
+            )
+            for rule, value in stats[name].items():
+                counter.add_metric([rule], value)
+            yield counter
+        yield CounterMetricFamily(
+            "rate_limit_backend_errors", "Rate limit checks let through because the backend failed",
+            value=stats["backend_errors"]
+        )
+
+
+def register_chat_collector(manager):
+    REGISTRY.register(ChatCollector(manager))
+
+
+def register_message_writer_collector(writer):
+    REGISTRY.register(MessageWriterCollector(writer))
+
+
+def register_rate_limit_collector(limiter):
+    REGISTRY.register(RateLimitCollector(limiter))
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -40,6 +40,8 @@ class TravelGroup(BaseModel):
     max_members: int
     admin_id: str
     members: List[str] = Field(default_factory=list)
+    member_count: int = 0
+    last_seq: int = 0
     imageUrl: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -82,6 +84,7 @@ class Message(BaseModel):
     sender_id: str
     sender_name: str
     content: str
+    seq: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class MessageCreate(BaseModel):
@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from pymongo import DESCENDING
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump_value(value):
+    # Datetimes are tagged so the cursor compares against the stored BSON
+    # date rather than its string form.
+    if isinstance(value, datetime):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(doc: dict, sort_field: str = "created_at") -> str:
+    raw = json.dumps([_dump_value(doc[sort_field]), doc["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return _load_value(value), doc_id
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_query(query: dict, cursor: str = None, sort_field: str = "created_at", direction: int = DESCENDING) -> dict:
+    """Restrict `query` to documents after `cursor` in (sort_field, id) order."""
+    if not cursor:
+        return query
+    return {"$and": [query, _after_cursor(cursor, sort_field, direction)]}
+
+
+def _after_cursor(cursor: str, sort_field: str, direction: int) -> dict:
+    value, doc_id = decode_cursor(cursor)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    return {
+        "$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "id": {op: doc_id}},
+        ]
+    }
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    limit: int,
+    cursor: str = None,
+    direction: int = DESCENDING,
+    projection: dict = None,
+    sort_field: str = "created_at",
+):
+    """Fetch one page of `collection` in (sort_field, id) order.
+
+    Returns the documents and the cursor for the following page, or None
+    when this is the last one. One extra document is read to know whether
+    another page exists, so no count query is needed.
+    """
+    docs = await collection.find(
+        page_query(query, cursor, sort_field, direction),
+        projection if projection is not None else {"_id": 0}
+    ).sort([(sort_field, direction), ("id", direction)]).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+
+    return docs, next_cursor
@@ -0,0 +1,190 @@
+"""Token-bucket rate limits for the expensive or abusable endpoints.
+
+Each rule is a bucket of `capacity` tokens per key (client IP or user id)
+that refills at capacity/period tokens a second; every request takes one.
+Rules are set as "capacity/period_seconds", e.g. RATE_LIMIT_LOGIN=10/60,
+or "off" to disable one.
+
+HTTP routes use RateLimiter.limit() as a dependency and get a 429 with
+Retry-After. The chat socket calls hit() per message: over-limit messages
+are dropped with a rate_limited notice, and a client that keeps sending
+through WS_MAX_REJECTIONS notices in a row is closed with 1008.
+
+Buckets live in this process by default. With several workers set
+RATE_LIMIT_URL=redis://... so they share one bucket per key; if Redis is
+unreachable requests are let through rather than refused.
+"""
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Depends, HTTPException, Request, status
+
+from auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+# Set to the header a trusted reverse proxy appends the client address to
+# (e.g. X-Forwarded-For); the last entry is used, since earlier ones come
+# from the client and can be forged.
+FORWARDED_HEADER = os.environ.get("RATE_LIMIT_FORWARDED_HEADER", "")
+WS_MAX_REJECTIONS = int(os.environ.get("RATE_LIMIT_WS_MAX_REJECTIONS", "20"))
+
+# 1008 "Policy Violation", so the client does not reconnect and carry on.
+RATE_LIMITED_CLOSE_CODE = 1008
+
+KEY_PREFIX = "chalboo:ratelimit:"
+
+
+def parse_rule(value: str):
+    """Parse "capacity/period_seconds" into (capacity, tokens per second); None if off."""
+    if value.strip().lower() in ("", "off", "0"):
+        return None
+    capacity, period = value.split("/")
+    return float(capacity), float(capacity) / float(period)
+
+
+RATE_LIMITS = {
+    # Per client IP; both run bcrypt.
+    "login": parse_rule(os.environ.get("RATE_LIMIT_LOGIN", "10/60")),
+    "signup": parse_rule(os.environ.get("RATE_LIMIT_SIGNUP", "5/600")),
+    # Per user.
+    "join_request": parse_rule(os.environ.get("RATE_LIMIT_JOIN_REQUEST", "10/60")),
+    "chat_message": parse_rule(os.environ.get("RATE_LIMIT_CHAT_MESSAGE", "30/30")),
+}
+
+
+class MemoryRateLimitBackend:
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        # Least recently used buckets go first; an idle bucket is full anyway.
+        while len(self.buckets) > self.maxsize:
+            self.buckets.popitem(last=False)
+        return retry_after
+
+
+# Refill, take one token and report the wait, atomically. The result is a
+# string because Redis truncates Lua numbers to integers.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimitBackend:
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL points at Redis but the 'redis' package is not installed")
+        self.redis = redis.from_url(url)
+        self.script = self.redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        result = await self.script(keys=[KEY_PREFIX + key], args=[capacity, rate, time.time()])
+        return float(result)
+
+
+def create_rate_limit_backend(url: str = None):
+    url = url if url is not None else os.environ.get("RATE_LIMIT_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisRateLimitBackend(url)
+    if url:
+        raise RuntimeError(f"Unsupported RATE_LIMIT_URL: {url}")
+    return MemoryRateLimitBackend()
+
+
+def client_ip(request: Request) -> str:
+    if FORWARDED_HEADER:
+        forwarded = request.headers.get(FORWARDED_HEADER)
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    def __init__(self, backend, rules: dict = None):
+        self.backend = backend
+        self.rules = rules if rules is not None else RATE_LIMITS
+        self.allowed = dict.fromkeys(self.rules, 0)
+        self.rejected = dict.fromkeys(self.rules, 0)
+        self.backend_errors = 0
+
+    async def hit(self, rule: str, key: str) -> float:
+        """Take a token from `rule`'s bucket for `key`.
+
+        Returns 0 if the request may go ahead, otherwise the seconds until
+        it would be allowed.
+        """
+        limit = self.rules[rule]
+        if limit is None:
+            return 0.0
+        try:
+            retry_after = await self.backend.take(f"{rule}:{key}", *limit)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Rate limit check for {rule} failed, allowing: {e!r}")
+            return 0.0
+        if retry_after:
+            self.rejected[rule] += 1
+        else:
+            self.allowed[rule] += 1
+        return retry_after
+
+    async def check(self, rule: str, key: str):
+        retry_after = await self.hit(rule, key)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+    def limit(self, rule: str, by: str = "ip"):
+        """A route dependency applying `rule` per client IP or per user."""
+        if by == "user":
+            async def dependency(user_id: str = Depends(get_current_user)):
+                await self.check(rule, user_id)
+        elif by == "ip":
+            async def dependency(request: Request):
+                await self.check(rule, client_ip(request))
+        else:
+            raise ValueError(f"Unknown rate limit key: {by}")
+        return dependency
+
+    def stats(self) -> dict:
+        return {
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+            "backend_errors": self.backend_errors,
+        }
@@ -0,0 +1,146 @@
+"""Per-user rating aggregates.
+
+Each user document keeps `rating_sum` and `total_ratings`; `average_rating`
+is derived from them. Run this module directly to remove duplicate
+ratings (one rater, ratee and trip), make the ratings index unique and
+rebuild the aggregates for every user from the ratings collection:
+
+    python ratings.py
+
+The app will not start while the old, non-unique index is in place.
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from indexes import rebuild_index
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+UNIQUE_RATING_KEYS = [("from_user_id", ASCENDING), ("to_user_id", ASCENDING), ("group_id", ASCENDING)]
+
+
+async def apply_rating(db, to_user_id: str, stars: int):
+    """Fold one new rating into the target user's aggregate in O(1)."""
+    user = await db.users.find_one_and_update(
+        {"id": to_user_id},
+        {"$inc": {"rating_sum": stars, "total_ratings": 1}},
+        projection={"_id": 0, "rating_sum": 1, "total_ratings": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
+        return
+
+    # Only write the average if no other rating landed in between; if one did,
+    # its own update carries the newer sum and count.
+    await db.users.update_one(
+        {"id": to_user_id, "total_ratings": user["total_ratings"]},
+        {"$set": {"average_rating": user["rating_sum"] / user["total_ratings"]}}
+    )
+
+
+async def remove_duplicate_ratings(db) -> int:
+    """Keep the first rating per (from_user_id, to_user_id, group_id).
+
+    Needed once before the unique index on those fields can be built.
+    Returns the number of ratings deleted.
+    """
+    pipeline = [
+        {"$sort": {"created_at": 1, "id": 1}},
+        {"$group": {
+            "_id": {"from": "$from_user_id", "to": "$to_user_id", "group": "$group_id"},
+            "ids": {"$push": "$id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+    duplicate_ids = []
+    async for row in db.ratings.aggregate(pipeline, allowDiskUse=True):
+        duplicate_ids.extend(row["ids"][1:])
+    for start in range(0, len(duplicate_ids), BACKFILL_BATCH_SIZE):
+        await db.ratings.delete_many({"id": {"$in": duplicate_ids[start:start + BACKFILL_BATCH_SIZE]}})
+
+    logger.info(f"Removed {len(duplicate_ids)} duplicate ratings")
+    return len(duplicate_ids)
+
+
+async def make_ratings_unique(db) -> bool:
+    """Remove duplicate ratings and rebuild their index as unique.
+
+    Returns whether the index had to be rebuilt.
+    """
+    await remove_duplicate_ratings(db)
+    # Ratings can still be duplicated until the unique index exists, so
+    # clean up again once the old index is gone.
+    return await rebuild_index(db, "ratings", UNIQUE_RATING_KEYS, prepare=lambda: remove_duplicate_ratings(db))
+
+
+async def recompute_rating_aggregates(db) -> int:
+    """Rebuild rating_sum/total_ratings/average_rating for all users.
+
+    The sums are computed server-side with a $group pipeline; users with no
+    ratings are reset to zero. Returns the number of users with ratings.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": "$to_user_id",
+            "rating_sum": {"$sum": "$stars"},
+            "total_ratings": {"$sum": 1},
+        }}
+    ]
+
+    rated_ids = set()
+    batch = []
+    async for row in db.ratings.aggregate(pipeline):
+        rated_ids.add(row["_id"])
+        batch.append(UpdateOne(
+            {"id": row["_id"]},
+            {"$set": {
+                "rating_sum": row["rating_sum"],
+                "total_ratings": row["total_ratings"],
+                "average_rating": row["rating_sum"] / row["total_ratings"],
+            }}
+        ))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            await db.users.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.users.bulk_write(batch, ordered=False)
+
+    stale_ids = [
+        user["id"]
+        async for user in db.users.find({"total_ratings": {"$gt": 0}}, {"_id": 0, "id": 1})
+        if user["id"] not in rated_ids
+    ]
+    for start in range(0, len(stale_ids), BACKFILL_BATCH_SIZE):
+        await db.users.update_many(
+            {"id": {"$in": stale_ids[start:start + BACKFILL_BATCH_SIZE]}},
+            {"$set": {"rating_sum": 0, "total_ratings": 0, "average_rating": 0.0}}
+        )
+
+    logger.info(f"Recomputed rating aggregates for {len(rated_ids)} users")
+    return len(rated_ids)
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await make_ratings_unique(db)
+        await recompute_rating_aggregates(db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
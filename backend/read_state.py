@@ -0,0 +1,285 @@
+"""Per-group message sequence numbers and per-user read markers.
+
+Every message gets the next value of its group's counter, so the numbers
+are gap-free and in delivery order. A member's read marker is the highest
+seq they have read, which makes the unread count for a group
+`last_seq - last_read_seq`: a subtraction, not a count query.
+
+SeqAllocator hands out seqs without a Mongo round trip on the chat path.
+Counters live in this process, or in Redis when CHAT_SEQ_URL (default:
+CHAT_BROKER_URL) is set, since several workers must share one counter per
+group. A group's counter is seeded from Mongo on first use. travel_groups.
+last_seq is written behind with one bulk $max every
+READ_FLUSH_INTERVAL_SECONDS, so the dashboard's counts may trail the chat
+by that much.
+
+Read receipts arrive on the websocket every time an open chat shows new
+messages. ReadMarkerWriter keeps only the highest seq per (user, group) in
+memory and writes them with one bulk $max upsert every
+READ_FLUSH_INTERVAL_SECONDS, so a busy chat costs one write per interval,
+not one per message.
+
+Run this module directly, before deploying the code that assigns
+sequence numbers, to number the messages already stored:
+
+    python read_state.py
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import DESCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+READ_FLUSH_INTERVAL_SECONDS = float(os.environ.get("CHAT_READ_FLUSH_SECONDS", "2"))
+BACKFILL_BATCH_SIZE = 1000
+
+
+class MemorySeqBackend:
+    def __init__(self):
+        self.values = {}
+
+    async def incr(self, group_id: str):
+        """The next seq, or None if the group's counter is not seeded."""
+        if group_id not in self.values:
+            return None
+        self.values[group_id] += 1
+        return self.values[group_id]
+
+    async def get(self, group_id: str):
+        return self.values.get(group_id)
+
+    async def seed(self, group_id: str, value: int):
+        self.values.setdefault(group_id, value)
+
+
+# INCR would start a missing counter at 1; report it unseeded instead.
+_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+return redis.call('INCR', KEYS[1])
+"""
+
+
+class RedisSeqBackend:
+    KEY_PREFIX = "chalboo:seq:"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CHAT_SEQ_URL points at Redis but the 'redis' package is not installed")
+        self.redis = redis.from_url(url)
+        self.script = self.redis.register_script(_INCR_SCRIPT)
+
+    async def incr(self, group_id: str):
+        return await self.script(keys=[self.KEY_PREFIX + group_id])
+
+    async def get(self, group_id: str):
+        value = await self.redis.get(self.KEY_PREFIX + group_id)
+        return int(value) if value is not None else None
+
+    async def seed(self, group_id: str, value: int):
+        await self.redis.set(self.KEY_PREFIX + group_id, value, nx=True)
+
+
+def create_seq_backend(url: str = None):
+    if url is None:
+        url = os.environ.get("CHAT_SEQ_URL", os.environ.get("CHAT_BROKER_URL", ""))
+    if url.startswith(("redis://", "rediss://")):
+        return RedisSeqBackend(url)
+    if url:
+        raise RuntimeError(f"Unsupported CHAT_SEQ_URL: {url}")
+    return MemorySeqBackend()
+
+
+class SeqAllocator:
+    def __init__(self, db, backend):
+        self.db = db
+        self.backend = backend
+        # group_id -> highest seq handed out and not yet written to last_seq.
+        self.pending = {}
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    async def next_seq(self, group_id: str):
+        """Allocate the next seq for group_id, or None if the group is gone."""
+        seq = await self.backend.incr(group_id)
+        if seq is None:
+            if not await self._seed(group_id):
+                return None
+            seq = await self.backend.incr(group_id)
+        if seq > self.pending.get(group_id, 0):
+            self.pending[group_id] = seq
+        return seq
+
+    async def last_seq(self, group_id: str) -> int:
+        """The group's newest seq, including ones not written to Mongo yet."""
+        value = await self.backend.get(group_id)
+        if value is None:
+            if not await self._seed(group_id):
+                return 0
+            value = await self.backend.get(group_id)
+        return value
+
+    async def _seed(self, group_id: str) -> bool:
+        # Concurrent seeds of one group are fine: only the first one sticks.
+        group = await self.db.travel_groups.find_one({"id": group_id}, {"_id": 0, "last_seq": 1})
+        if not group:
+            return False
+        # Messages may be stored ahead of last_seq if the process stopped
+        # before its last flush.
+        newest = await self.db.messages.find_one(
+            {"group_id": group_id}, {"_id": 0, "seq": 1}, sort=[("seq", DESCENDING)]
+        )
+        await self.backend.seed(group_id, max(group.get("last_seq", 0), (newest or {}).get("seq", 0)))
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(READ_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            await self.db.travel_groups.bulk_write([
+                UpdateOne({"id": group_id}, {"$max": {"last_seq": seq}})
+                for group_id, seq in batch.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to store last_seq for {len(batch)} groups: {e}")
+            for group_id, seq in batch.items():
+                self.pending[group_id] = max(seq, self.pending.get(group_id, 0))
+
+
+def unread_count(last_seq: int, last_read_seq: int) -> int:
+    return max(0, (last_seq or 0) - (last_read_seq or 0))
+
+
+class ReadMarkerWriter:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.read_markers
+        self.pending = {}
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    def mark(self, user_id: str, group_id: str, seq: int):
+        key = (user_id, group_id)
+        if seq > self.pending.get(key, 0):
+            self.pending[key] = seq
+
+    def discard_group(self, group_id: str):
+        """Forget receipts for a group that is being deleted."""
+        for key in [key for key in self.pending if key[1] == group_id]:
+            del self.pending[key]
+
+    async def last_read_seq(self, user_id: str, group_id: str) -> int:
+        """The user's marker, including a receipt that is not flushed yet."""
+        marker = await self.collection.find_one(
+            {"user_id": user_id, "group_id": group_id}, {"_id": 0, "last_read_seq": 1}
+        )
+        stored = marker["last_read_seq"] if marker else 0
+        return max(stored, self.pending.get((user_id, group_id), 0))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(READ_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        now = datetime.now(timezone.utc)
+        try:
+            # The upsert would bring back markers for a group deleted since
+            # the receipt arrived, after its cascade has removed them.
+            group_ids = list({group_id for _, group_id in batch})
+            live = set(await self.db.travel_groups.distinct("id", {"id": {"$in": group_ids}}))
+            batch = {key: seq for key, seq in batch.items() if key[1] in live}
+            if not batch:
+                return
+            await self.collection.bulk_write([
+                UpdateOne(
+                    {"user_id": user_id, "group_id": group_id},
+                    {"$max": {"last_read_seq": seq}, "$set": {"updated_at": now}},
+                    upsert=True
+                )
+                for (user_id, group_id), seq in batch.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to store {len(batch)} read markers: {e}")
+            # Keep them for the next flush unless newer receipts replaced them.
+            for key, seq in batch.items():
+                self.pending[key] = max(seq, self.pending.get(key, 0))
+
+
+async def backfill_message_seqs(db) -> int:
+    """Number each group's stored messages 1..n in (created_at, id) order."""
+    groups = 0
+    async for group in db.travel_groups.find({}, {"_id": 0, "id": 1}):
+        seq = 0
+        batch = []
+        cursor = db.messages.find({"group_id": group["id"]}, {"_id": 1}).sort([("created_at", 1), ("id", 1)])
+        async for message in cursor:
+            seq += 1
+            batch.append(UpdateOne({"_id": message["_id"]}, {"$set": {"seq": seq}}))
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                await db.messages.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await db.messages.bulk_write(batch, ordered=False)
+        await db.travel_groups.update_one({"id": group["id"]}, {"$set": {"last_seq": seq}})
+        groups += 1
+
+    logger.info(f"Numbered messages in {groups} groups")
+    return groups
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        await backfill_message_seqs(client[os.environ['DB_NAME']])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,282 @@
+"""Recommended travel groups.
+
+Every upcoming group is one row of a columnar NumPy feature matrix: budget
+range, travel date, origin city, trip type, capacity, and the mean age and
+rating of its members. A user's request scores every row in one vectorized
+pass and returns the top k, so serving cost stays in milliseconds with
+100k+ open groups.
+
+Handlers that change a group call refresh_group()/remove_group() so this
+worker's matrix follows its own writes right away. A full rebuild every
+RECOMMENDER_REFRESH_SECONDS picks up changes made by other workers, rating
+changes, and groups whose travel date has passed.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hydration import fetch_users
+from search import location_tokens
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.environ.get("RECOMMENDER_REFRESH_SECONDS", "300"))
+LOAD_BATCH_SIZE = 1000
+USER_HISTORY_LIMIT = 200
+
+# Relative weight of each signal; each signal scores a group from 0 to 1.
+WEIGHTS = {
+    "budget": 3.0,
+    "date": 2.0,
+    "trip_type": 2.0,
+    "city": 1.5,
+    "age": 1.5,
+    "rating": 1.0,
+}
+
+DAY_SECONDS = 86400.0
+
+_GROUP_FIELDS = {
+    "_id": 0, "id": 1, "from_location": 1, "budget_min": 1, "budget_max": 1,
+    "trip_type": 1, "travel_date": 1, "members": 1, "max_members": 1,
+}
+_MEMBER_FIELDS = ("id", "age", "average_rating", "total_ratings")
+
+
+def _city_key(text: str) -> str:
+    return " ".join(location_tokens(text))
+
+
+class FeatureMatrix:
+    """Group features stored column-wise, one row per group.
+
+    Removal moves the last row into the freed slot, so the live rows are
+    always the first `size` entries of every column.
+    """
+
+    FLOAT_COLUMNS = ("budget_min", "budget_max", "travel_ts", "mean_age", "mean_rating",
+                     "rated_members", "member_count", "max_members")
+    CODE_COLUMNS = ("origin", "trip_type")
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.ids = []
+        self.rows = {}
+        self.columns = {name: np.zeros(capacity) for name in self.FLOAT_COLUMNS}
+        self.columns.update({name: np.full(capacity, -1, dtype=np.int32) for name in self.CODE_COLUMNS})
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            fill = -1 if name in self.CODE_COLUMNS else 0
+            self.columns[name] = np.concatenate([column, np.full_like(column, fill)])
+
+    def upsert(self, group_id: str, values: dict):
+        row = self.rows.get(group_id)
+        if row is None:
+            if self.size == len(self.columns["travel_ts"]):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.rows[group_id] = row
+            self.ids.append(group_id)
+        for name, value in values.items():
+            self.columns[name][row] = value
+
+    def remove(self, group_id: str):
+        row = self.rows.pop(group_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved = self.ids[last]
+            for column in self.columns.values():
+                column[row] = column[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+        self.size -= 1
+
+    def view(self, name: str):
+        return self.columns[name][:self.size]
+
+
+class GroupRecommender:
+    def __init__(self, db):
+        self.db = db
+        self.matrix = FeatureMatrix()
+        self.codes = {}
+        self.task = None
+        # Incremental changes made while a rebuild is loading, replayed
+        # onto the rebuilt matrix so they are not lost.
+        self.pending = None
+
+    def _code(self, value: str) -> int:
+        if not value:
+            return -1
+        return self.codes.setdefault(value, len(self.codes))
+
+    def _features(self, group: dict, users: dict) -> dict:
+        members = [users[member_id] for member_id in group.get("members", []) if member_id in users]
+        rated = [member for member in members if member.get("total_ratings")]
+        return {
+            "budget_min": group["budget_min"],
+            "budget_max": group["budget_max"],
+            "travel_ts": group["travel_date"].timestamp(),
+            "mean_age": float(np.mean([member["age"] for member in members])) if members else 0.0,
+            "mean_rating": float(np.mean([member["average_rating"] for member in rated])) if rated else 0.0,
+            "rated_members": len(rated),
+            "member_count": len(group.get("members", [])),
+            "max_members": group["max_members"],
+            "origin": self._code(_city_key(group["from_location"])),
+            "trip_type": self._code((group.get("trip_type") or "").strip().lower()),
+        }
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Recommendation rebuild failed: {e}")
+            await asyncio.sleep(REFRESH_SECONDS)
+
+    async def rebuild(self):
+        """Reload every upcoming group into a fresh matrix and swap it in."""
+        self.pending = []
+        try:
+            matrix = FeatureMatrix()
+            now = datetime.now(timezone.utc)
+            cursor = self.db.travel_groups.find({"travel_date": {"$gte": now}}, _GROUP_FIELDS)
+            batch = []
+            async for group in cursor:
+                batch.append(group)
+                if len(batch) >= LOAD_BATCH_SIZE:
+                    await self._load_batch(matrix, batch)
+                    batch = []
+            if batch:
+                await self._load_batch(matrix, batch)
+
+            for apply in self.pending:
+                apply(matrix)
+            self.matrix = matrix
+        finally:
+            self.pending = None
+        logger.info(f"Recommendation matrix rebuilt with {matrix.size} groups")
+
+    async def _load_batch(self, matrix: FeatureMatrix, groups: list):
+        users = await fetch_users(
+            self.db, (member_id for group in groups for member_id in group["members"]), fields=_MEMBER_FIELDS
+        )
+        for group in groups:
+            matrix.upsert(group["id"], self._features(group, users))
+
+    def _apply(self, change):
+        change(self.matrix)
+        if self.pending is not None:
+            self.pending.append(change)
+
+    async def refresh_group(self, group_id: str):
+        group = await self.db.travel_groups.find_one({"id": group_id}, _GROUP_FIELDS)
+        if not group or group["travel_date"] < datetime.now(timezone.utc):
+            self.remove_group(group_id)
+            return
+        users = await fetch_users(self.db, group["members"], fields=_MEMBER_FIELDS)
+        features = self._features(group, users)
+        self._apply(lambda matrix: matrix.upsert(group_id, features))
+
+    def remove_group(self, group_id: str):
+        self._apply(lambda matrix: matrix.remove(group_id))
+
+    def _preferences(self, user: dict, joined: list, budget_min, budget_max, trip_type, travel_date) -> dict:
+        """Explicit preferences win; otherwise they come from the user's groups."""
+        if budget_min is None and budget_max is None and joined:
+            budget_min = float(np.mean([group["budget_min"] for group in joined]))
+            budget_max = float(np.mean([group["budget_max"] for group in joined]))
+        if trip_type is None and joined:
+            types = [group["trip_type"].strip().lower() for group in joined if group.get("trip_type")]
+            trip_type = max(set(types), key=types.count) if types else None
+        return {
+            "budget_min": budget_min,
+            "budget_max": budget_max,
+            "trip_type": self.codes.get(trip_type.strip().lower()) if trip_type else None,
+            "travel_ts": travel_date.timestamp() if travel_date else None,
+            "age": user.get("age"),
+            "origin": self.codes.get(_city_key(user.get("city", ""))),
+        }
+
+    def score(self, matrix: FeatureMatrix, prefs: dict, now_ts: float) -> np.ndarray:
+        col = matrix.view
+        score = np.zeros(matrix.size)
+
+        if prefs["budget_min"] is not None or prefs["budget_max"] is not None:
+            low = prefs["budget_min"] if prefs["budget_min"] is not None else 0.0
+            high = prefs["budget_max"] if prefs["budget_max"] is not None else np.inf
+            overlap = np.minimum(col("budget_max"), high) - np.maximum(col("budget_min"), low)
+            span = np.minimum(col("budget_max") - col("budget_min"), high - low)
+            budget = np.clip(overlap / np.maximum(span, 1.0), 0.0, 1.0)
+        else:
+            budget = 0.5
+        score += WEIGHTS["budget"] * budget
+
+        days_away = (col("travel_ts") - now_ts) / DAY_SECONDS
+        if prefs["travel_ts"] is not None:
+            date = np.exp(-np.abs(col("travel_ts") - prefs["travel_ts"]) / DAY_SECONDS / 14.0)
+        else:
+            date = 1.0 / (1.0 + np.maximum(days_away, 0.0) / 30.0)
+        score += WEIGHTS["date"] * date
+
+        if prefs["trip_type"] is not None:
+            score += WEIGHTS["trip_type"] * (col("trip_type") == prefs["trip_type"])
+        else:
+            score += WEIGHTS["trip_type"] * 0.5
+
+        if prefs["origin"] is not None:
+            score += WEIGHTS["city"] * (col("origin") == prefs["origin"])
+
+        if prefs["age"]:
+            score += WEIGHTS["age"] * np.exp(-np.abs(col("mean_age") - prefs["age"]) / 10.0)
+
+        score += WEIGHTS["rating"] * np.where(col("rated_members") > 0, col("mean_rating") / 5.0, 0.5)
+
+        # Past trips and full groups are never recommended.
+        score[(days_away < 0) | (col("member_count") >= col("max_members"))] = -np.inf
+        return score
+
+    async def recommend(self, user: dict, limit: int, budget_min: float = None, budget_max: float = None,
+                        trip_type: str = None, travel_date: datetime = None) -> list:
+        """Top `limit` (group_id, score) pairs for `user`, best first."""
+        joined = await self.db.travel_groups.find(
+            {"members": user["id"]},
+            {"_id": 0, "id": 1, "budget_min": 1, "budget_max": 1, "trip_type": 1}
+        ).limit(USER_HISTORY_LIMIT).to_list(USER_HISTORY_LIMIT)
+
+        matrix = self.matrix
+        if not matrix.size:
+            return []
+        prefs = self._preferences(user, joined, budget_min, budget_max, trip_type, travel_date)
+        scores = self.score(matrix, prefs, datetime.now(timezone.utc).timestamp())
+        for group in joined:
+            row = matrix.rows.get(group["id"])
+            if row is not None:
+                scores[row] = -np.inf
+
+        k = min(limit, matrix.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(matrix.ids[row], float(scores[row])) for row in top if np.isfinite(scores[row])]
@@ -0,0 +1,144 @@
+"""Cache for the public, read-heavy group endpoints.
+
+Entries hold the already-serialized JSON body, its ETag and any extra
+headers, so a hit costs no Mongo round trip and no serialization. Clients
+that send If-None-Match with the current ETag get an empty 304.
+
+Per-group entries are deleted by the handlers that change the group.
+Search results cannot be enumerated cheaply, so their keys carry a
+version number that any group change bumps. The in-process backend is
+used by default. Set RESPONSE_CACHE_URL=redis://... to share entries and
+invalidations across workers; otherwise the TTL bounds how long another
+worker may serve a stale entry.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+SEARCH_VERSION_KEY = "groups:search-version"
+
+
+class MemoryCacheBackend:
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.counters = {}
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    async def get_counter(self, key: str) -> int:
+        return self.counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+
+class RedisCacheBackend:
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_URL points at Redis but the 'redis' package is not installed")
+        self.redis = redis.from_url(url)
+
+    async def get(self, key: str):
+        return await self.redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.redis.set(key, value, ex=ttl)
+
+    async def delete(self, *keys):
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def get_counter(self, key: str) -> int:
+        value = await self.redis.get(key)
+        return int(value) if value else 0
+
+    async def incr(self, key: str) -> int:
+        return await self.redis.incr(key)
+
+
+def create_cache_backend(url: str = None):
+    url = url if url is not None else os.environ.get("RESPONSE_CACHE_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(url)
+    if url:
+        raise RuntimeError(f"Unsupported RESPONSE_CACHE_URL: {url}")
+    return MemoryCacheBackend()
+
+
+def group_key(group_id: str) -> str:
+    return f"group:{group_id}"
+
+
+def members_key(group_id: str) -> str:
+    return f"group-members:{group_id}"
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def search_key(self, params: dict) -> str:
+        version = await self.backend.get_counter(SEARCH_VERSION_KEY)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"groups:search:{version}:{digest}"
+
+    async def respond(self, request: Request, key: str, build) -> Response:
+        """Serve `key` from the cache, or call build() and cache its result.
+
+        build() returns (body_bytes, headers_dict).
+        """
+        raw = await self.backend.get(key)
+        if raw is not None:
+            self.hits += 1
+            envelope = json.loads(raw)
+            etag, headers, body = envelope["etag"], envelope["headers"], envelope["body"].encode()
+        else:
+            self.misses += 1
+            body, headers = await build()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            envelope = {"etag": etag, "headers": headers, "body": body.decode()}
+            await self.backend.set(key, json.dumps(envelope).encode(), self.ttl)
+
+        headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def invalidate_group(self, group_id: str):
+        await self.backend.delete(group_key(group_id), members_key(group_id))
+        await self.backend.incr(SEARCH_VERSION_KEY)
+
+    async def invalidate_search(self):
+        await self.backend.incr(SEARCH_VERSION_KEY)
@@ -0,0 +1,281 @@
+"""Travel group search.
+
+Locations are normalized into lowercase, accent-free word tokens when a
+group is written (`from_tokens`/`to_tokens`), so "man" finds "Manali".
+
+A prefix is a range on the token field, and MongoDB cannot take a sort
+from an index after a range: every match would be sorted in memory.
+LocationVocabulary keeps the distinct tokens in memory and turns a prefix
+into the exact tokens it matches, queried with $in. With the
+(tokens, created_at, id) and (tokens, travel_date, id) indexes MongoDB then
+merges one sorted index scan per token, so a page costs the same however
+many groups match. Prefixes matching more than MAX_PREFIX_TOKENS tokens
+fall back to the regex range scan.
+
+An $in list is only as good as the vocabulary it came from, so every
+group write bumps a shared version (search_state.locations) and a worker
+only expands prefixes while its vocabulary is at that version. Otherwise
+it uses the regex until the reload it has just asked for completes.
+
+Run this module directly to add the search fields to groups created before
+it existed, or tokenized by an older version of location_tokens:
+
+    python search.py
+"""
+import asyncio
+import bisect
+import logging
+import os
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+# MongoDB merges at most 200 index scans for a sorted $in
+# (internalQueryMaxScansToExplode); beyond that it would sort in memory.
+MAX_PREFIX_TOKENS = int(os.environ.get("SEARCH_MAX_PREFIX_TOKENS", "100"))
+VOCABULARY_REFRESH_SECONDS = float(os.environ.get("SEARCH_VOCABULARY_REFRESH_SECONDS", "30"))
+# A stale vocabulary is reloaded at once, but at most this often.
+VOCABULARY_MIN_REFRESH_SECONDS = float(os.environ.get("SEARCH_VOCABULARY_MIN_REFRESH_SECONDS", "1"))
+TOKEN_FIELDS = ("from_tokens", "to_tokens")
+VOCABULARY_STATE_ID = "locations"
+
+
+def _word_character(c: str) -> bool:
+    # Letters, digits and marks: \w alone would split Devanagari words at
+    # their vowel signs, which are spacing marks.
+    return unicodedata.category(c)[0] in "LMN"
+
+
+def location_tokens(text: str) -> list:
+    normalized = unicodedata.normalize("NFKD", text or "")
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c)).casefold()
+    words = "".join(c if _word_character(c) else " " for c in normalized).split()
+    return list(dict.fromkeys(words))
+
+
+def search_fields(from_location: str, to_location: str) -> dict:
+    return {
+        "from_tokens": location_tokens(from_location),
+        "to_tokens": location_tokens(to_location),
+    }
+
+
+def parse_travel_date(value: str) -> datetime:
+    """Parse an ISO date/datetime, treating naive values as UTC."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class LocationVocabulary:
+    """Distinct location tokens per field, for expanding search prefixes.
+
+    Reloaded every VOCABULARY_REFRESH_SECONDS, and soon after is_current()
+    finds another worker has written a group since the last load.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.tokens = {field: [] for field in TOKEN_FIELDS}
+        # None until loaded: never current.
+        self.version = None
+        self.stale = asyncio.Event()
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            self.stale.clear()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Location vocabulary refresh failed: {e}")
+            await asyncio.sleep(VOCABULARY_MIN_REFRESH_SECONDS)
+            try:
+                await asyncio.wait_for(self.stale.wait(), VOCABULARY_REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _shared_version(self) -> int:
+        state = await self.db.search_state.find_one({"_id": VOCABULARY_STATE_ID})
+        return state["version"] if state else 0
+
+    async def refresh(self):
+        # Version first: a group written during the reload bumps it again
+        # afterwards, so the worst case is one reload too many.
+        version = await self._shared_version()
+        tokens = {field: sorted(await self.db.travel_groups.distinct(field)) for field in TOKEN_FIELDS}
+        self.tokens = tokens
+        self.version = version
+
+    async def record(self, fields: dict):
+        """Record the tokens of a group this worker just wrote.
+
+        Call after the write, so any worker that sees the new version also
+        finds the group's tokens when it reloads.
+        """
+        if not any(field in fields for field in TOKEN_FIELDS):
+            return
+        for field in TOKEN_FIELDS:
+            known = self.tokens[field]
+            for token in fields.get(field, ()):
+                index = bisect.bisect_left(known, token)
+                if index == len(known) or known[index] != token:
+                    known.insert(index, token)
+        state = await self.db.search_state.find_one_and_update(
+            {"_id": VOCABULARY_STATE_ID},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        # Only ours since the last load: still complete. Otherwise someone
+        # else wrote in between and is_current() will ask for a reload.
+        if self.version is not None and state["version"] == self.version + 1:
+            self.version = state["version"]
+
+    async def is_current(self) -> bool:
+        """Whether the vocabulary holds every token written so far."""
+        if self.version is not None and await self._shared_version() == self.version:
+            return True
+        self.stale.set()
+        return False
+
+    def expand(self, field: str, prefix: str):
+        """Known tokens starting with `prefix`, or None to use a regex instead."""
+        known = self.tokens[field]
+        start = bisect.bisect_left(known, prefix)
+        end = bisect.bisect_left(known, prefix + "\uffff", start)
+        if start == end or end - start > MAX_PREFIX_TOKENS:
+            return None
+        return known[start:end]
+
+
+def _prefix_clauses(field: str, text: str, vocabulary: LocationVocabulary = None) -> list:
+    tokens = location_tokens(text)
+    if not tokens:
+        # Nothing searchable left after normalization: match nothing rather
+        # than silently dropping the filter.
+        return [{field: {"$in": []}}]
+    clauses = []
+    for token in tokens:
+        matches = vocabulary.expand(field, token) if vocabulary else None
+        if matches is None:
+            clauses.append({field: re.compile("^" + re.escape(token))})
+        else:
+            clauses.append({field: {"$in": matches}})
+    return clauses
+
+
+def build_search_query(
+    from_location: str = None,
+    to_location: str = None,
+    travel_date: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    budget_min: int = None,
+    budget_max: int = None,
+    trip_type: str = None,
+    vocabulary: LocationVocabulary = None,
+) -> dict:
+    query = {}
+
+    token_clauses = []
+    for field, text in (("from_tokens", from_location), ("to_tokens", to_location)):
+        if text:
+            token_clauses.extend(_prefix_clauses(field, text, vocabulary))
+    if token_clauses:
+        query["$and"] = token_clauses
+
+    # travel_date keeps its old meaning (that whole day) and wins over the
+    # range bounds. A date_to without a time includes the whole day.
+    date_range = {}
+    if travel_date:
+        day = parse_travel_date(travel_date)
+        date_range = {"$gte": day, "$lt": day + timedelta(days=1)}
+    else:
+        if date_from:
+            date_range["$gte"] = parse_travel_date(date_from)
+        if date_to:
+            if "T" in date_to:
+                date_range["$lte"] = parse_travel_date(date_to)
+            else:
+                date_range["$lt"] = parse_travel_date(date_to) + timedelta(days=1)
+    if date_range:
+        query["travel_date"] = date_range
+
+    # Groups whose budget range overlaps the requested one.
+    if budget_min is not None:
+        query["budget_max"] = {"$gte": budget_min}
+    if budget_max is not None:
+        query["budget_min"] = {"$lte": budget_max}
+
+    if trip_type:
+        query["trip_type"] = trip_type.strip().lower()
+
+    return query
+
+
+async def backfill_search_fields(db) -> int:
+    """Add search tokens to every existing group."""
+    updated = 0
+    batch = []
+    cursor = db.travel_groups.find(
+        {},
+        {"_id": 0, "id": 1, "from_location": 1, "to_location": 1, "trip_type": 1}
+    )
+    async for group in cursor:
+        fields = search_fields(group.get("from_location"), group.get("to_location"))
+        if group.get("trip_type"):
+            fields["trip_type"] = group["trip_type"].strip().lower()
+        batch.append(UpdateOne({"id": group["id"]}, {"$set": fields}))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            await db.travel_groups.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.travel_groups.bulk_write(batch, ordered=False)
+        updated += len(batch)
+
+    logger.info(f"Backfilled search fields for {updated} groups")
+    return updated
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        await backfill_search_fields(client[os.environ['DB_NAME']])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""JSON encoding for the list endpoints.
+
+By default list bodies go through a pydantic TypeAdapter: each document is
+validated against its model and then dumped. Documents read back from our
+own collections were written from those same models (codec.to_document),
+so with FAST_JSON_RESPONSES=true that validation is skipped and the raw
+documents are encoded with orjson. The Mongo projection keeps the output
+in the model's shape: it returns exactly the model's fields, so internal
+fields such as search tokens never reach clients. Fields the model gives
+a plain default (e.g. seq, member_count, last_seq) may be missing from
+documents stored before they existed; the fast path fills those in the
+same way validation does.
+"""
+import os
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+
+def model_projection(model) -> dict:
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def _orjson_dumps():
+    try:
+        import orjson
+    except ImportError:
+        raise RuntimeError("FAST_JSON_RESPONSES is enabled but the 'orjson' package is not installed")
+    return lambda content: orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+class ListSerializer:
+    """Encodes lists of `model` documents, validating them unless `fast`."""
+
+    def __init__(self, model, fast: bool = None):
+        self.adapter = TypeAdapter(List[model])
+        self.item_adapter = TypeAdapter(model)
+        self.projection = model_projection(model)
+        self.fields = tuple(model.model_fields)
+        # Factory defaults (ids, timestamps) are always stored.
+        self.defaults = {
+            name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        self.fast = fast if fast is not None else FAST_JSON_RESPONSES
+        self._dumps = _orjson_dumps() if self.fast else None
+
+    def _with_defaults(self, doc: dict) -> dict:
+        if self.defaults.keys() <= doc.keys():
+            return doc
+        return {**self.defaults, **doc}
+
+    def dump(self, docs: list) -> bytes:
+        if self.fast:
+            return self._dumps([self._with_defaults(doc) for doc in docs])
+        return self.adapter.dump_json(self.adapter.validate_python(docs))
+
+    def dump_each(self, docs: list) -> list:
+        """Encode each document separately."""
+        if self.fast:
+            return [self._dumps(self._with_defaults(doc)) for doc in docs]
+        adapter = self.item_adapter
+        return [adapter.dump_json(adapter.validate_python(doc)) for doc in docs]
+
+    def dump_lines(self, docs: list) -> bytes:
+        """Encode docs as NDJSON: one document per line."""
+        return b"".join(line + b"\n" for line in self.dump_each(docs))
+
+    def response(self, docs: list, headers: dict = None) -> Response:
+        return Response(content=self.dump(docs), media_type="application/json", headers=headers)
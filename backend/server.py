@@ -1,6 +1,10 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from pydantic import TypeAdapter
 from dotenv import load_dotenv
 from models import TravelGroupUpdate
 import os
@@ -18,15 +22,38 @@ from models import (
     Rating, RatingCreate
 )
 from auth import (
-    get_password_hash, verify_password,
+    get_password_hash_async, verify_password_async,
     create_access_token, get_current_user
 )
+from indexes import ensure_indexes
+from broker import create_broker
+from codec import to_document
+from connections import ConnectionManager
+from message_writer import MessageWriter
+from user_cache import UserCache
+from membership import add_member, remove_member
+from group_deletion import GroupDeletionWorker, schedule_group_deletion
+from serialization import ListSerializer
+from export import gzip_chunks, iter_ndjson, settle_cutoff
+from response_cache import ResponseCache, create_cache_backend, group_key, members_key
+from metrics import (
+    MetricsMiddleware, MongoCommandListener, register_chat_collector, register_message_writer_collector,
+    register_rate_limit_collector, render_metrics
+)
+from recommendations import GroupRecommender
+from dashboard import load_dashboard
+from read_state import ReadMarkerWriter, SeqAllocator, create_seq_backend, unread_count
+from rate_limit import RATE_LIMITED_CLOSE_CODE, WS_MAX_REJECTIONS, RateLimiter, create_rate_limit_backend
+from hydration import fetch_users, attach_users
+from ratings import apply_rating
+from search import LocationVocabulary, build_search_query, parse_travel_date, search_fields
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, fetch_page
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandListener()])
 db = client[os.environ['DB_NAME']]
 
 app = FastAPI()
@@ -48,39 +75,40 @@ IMAGE_MAP = {
 }
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict = {}
-
-    async def connect(self, websocket: WebSocket, group_id: str, user_id: str):
-        await websocket.accept()
-        if group_id not in self.active_connections:
-            self.active_connections[group_id] = {}
-        self.active_connections[group_id][user_id] = websocket
-
-    def disconnect(self, group_id: str, user_id: str):
-        if group_id in self.active_connections:
-            self.active_connections[group_id].pop(user_id, None)
-            if not self.active_connections[group_id]:
-                del self.active_connections[group_id]
-
-    async def broadcast(self, group_id: str, message: dict):
-        if group_id in self.active_connections:
-            for user_id, connection in self.active_connections[group_id].items():
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
+manager = ConnectionManager(create_broker())
+register_chat_collector(manager)
+message_writer = MessageWriter(db.messages)
+register_message_writer_collector(message_writer)
+read_writer = ReadMarkerWriter(db)
+seq_allocator = SeqAllocator(db, create_seq_backend())
+user_cache = UserCache()
+deletion_worker = GroupDeletionWorker(db)
+response_cache = ResponseCache(create_cache_backend())
+recommender = GroupRecommender(db)
+locations = LocationVocabulary(db)
+rate_limiter = RateLimiter(create_rate_limit_backend())
+register_rate_limit_collector(rate_limiter)
+
+group_adapter = TypeAdapter(TravelGroup)
+group_list = ListSerializer(TravelGroup)
+member_list = ListSerializer(User)
+message_list = ListSerializer(Message)
+
+
+async def get_current_user_profile(user_id: str = Depends(get_current_user)) -> dict:
+    user = await user_cache.get(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
-manager = ConnectionManager()
 
-@api_router.post("/auth/signup")
+@api_router.post("/auth/signup", dependencies=[Depends(rate_limiter.limit("signup"))])
 async def signup(user_data: UserCreate):
     existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     user = User(
         name=user_data.name,
         email=user_data.email,
@@ -88,8 +116,7 @@ async def signup(user_data: UserCreate):
         age=user_data.age
     )
     
-    user_doc = user.model_dump()
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
+    user_doc = to_document(user)
     user_doc['password'] = hashed_password
     
     await db.users.insert_one(user_doc)
@@ -97,32 +124,24 @@ async def signup(user_data: UserCreate):
     token = create_access_token(data={"sub": user.id})
     return {"token": token, "user": user}
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limiter.limit("login"))])
 async def login(credentials: UserLogin):
-    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
+    # The password hash is needed to check it, and popped below.
+    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0, "rating_sum": 0})
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(credentials.password, user_doc['password']):
+    if not await verify_password_async(credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     user_doc.pop('password', None)
-    if isinstance(user_doc['created_at'], str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
     token = create_access_token(data={"sub": user_doc['id']})
     return {"token": token, "user": user_doc}
 
 @api_router.get("/auth/me")
-async def get_me(user_id: str = Depends(get_current_user)):
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
-    return user_doc
+async def get_me(user: dict = Depends(get_current_user_profile)):
+    return user
 
 @api_router.post("/groups", response_model=TravelGroup)
 async def create_group(
@@ -155,65 +174,86 @@ async def create_group(
     group = TravelGroup(
         from_location=group_data.from_location,
         to_location=group_data.to_location,
-        travel_date=datetime.fromisoformat(group_data.travel_date),
+        travel_date=parse_travel_date(group_data.travel_date),
         budget_min=group_data.budget_min,
         budget_max=group_data.budget_max,
-        trip_type=group_data.trip_type,
+        trip_type=group_data.trip_type.strip().lower(),
         description=group_data.description,
         max_members=group_data.max_members,
         admin_id=user_id,
         members=[user_id],
+        member_count=1,
         imageUrl=image_url,
     )
 
 
-    group_doc = group.model_dump()
-    group_doc["travel_date"] = group_doc["travel_date"].isoformat()
-    group_doc["created_at"] = group_doc["created_at"].isoformat()
+    group_doc = to_document(group)
+    group_doc.update(search_fields(group.from_location, group.to_location))
 
     await db.travel_groups.insert_one(group_doc)
+    await locations.record(group_doc)
+    await response_cache.invalidate_search()
+    await recommender.refresh_group(group.id)
     return group
 
 
 @api_router.get("/groups", response_model=List[TravelGroup])
 async def search_groups(
+    request: Request,
     from_location: Optional[str] = None,
     to_location: Optional[str] = None,
-    travel_date: Optional[str] = None
+    travel_date: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    budget_min: Optional[int] = None,
+    budget_max: Optional[int] = None,
+    trip_type: Optional[str] = None,
+    sort: str = Query("recent", pattern="^(recent|date)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
-    query = {}
-    if from_location:
-        query['from_location'] = {"$regex": from_location, "$options": "i"}
-    if to_location:
-        query['to_location'] = {"$regex": to_location, "$options": "i"}
-    if travel_date:
-        query['travel_date'] = {"$regex": travel_date}
-    
-    groups = await db.travel_groups.find(query, {"_id": 0}).to_list(100)
-    
-    for group in groups:
-        if isinstance(group.get('travel_date'), str):
-            group['travel_date'] = datetime.fromisoformat(group['travel_date'])
-        if isinstance(group.get('created_at'), str):
-            group['created_at'] = datetime.fromisoformat(group['created_at'])
-    
-    return groups
+    async def build():
+        # Prefixes are only expanded from a vocabulary with every location
+        # written so far; otherwise they fall back to a regex.
+        query = build_search_query(
+            from_location=from_location,
+            to_location=to_location,
+            travel_date=travel_date,
+            date_from=date_from,
+            date_to=date_to,
+            budget_min=budget_min,
+            budget_max=budget_max,
+            trip_type=trip_type,
+            vocabulary=locations if await locations.is_current() else None,
+        )
+        # "recent": newest groups first. "date": soonest trips first.
+        if sort == "date":
+            groups, next_cursor = await fetch_page(
+                db.travel_groups, query, limit, cursor,
+                direction=ASCENDING, projection=group_list.projection, sort_field="travel_date"
+            )
+        else:
+            groups, next_cursor = await fetch_page(
+                db.travel_groups, query, limit, cursor, projection=group_list.projection
+            )
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return group_list.dump(groups), headers
+    
+    key = await response_cache.search_key(dict(request.query_params))
+    return await response_cache.respond(request, key, build)
 
 @api_router.get("/groups/{group_id}", response_model=TravelGroup)
-async def get_group(group_id: str):
-    group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
-    if isinstance(group.get('travel_date'), str):
-        group['travel_date'] = datetime.fromisoformat(group['travel_date'])
-    if isinstance(group.get('created_at'), str):
-        group['created_at'] = datetime.fromisoformat(group['created_at'])
+async def get_group(group_id: str, request: Request):
+    async def build():
+        group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+        return group_adapter.dump_json(group_adapter.validate_python(group)), {}
     
-    return group
+    return await response_cache.respond(request, group_key(group_id), build)
 @api_router.delete("/groups/{group_id}")
 async def delete_group(group_id: str, user_id: str = Depends(get_current_user)):
-    group = await db.travel_groups.find_one({"id": group_id})
+    group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0, "id": 1, "admin_id": 1})
 
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
@@ -221,41 +261,35 @@ async def delete_group(group_id: str, user_id: str = Depends(get_current_user)):
     if group["admin_id"] != user_id:
         raise HTTPException(status_code=403, detail="Only admin can delete this group")
 
-    # Delete related data (optional but good practice)
-    await db.join_requests.delete_many({"group_id": group_id})
-    await db.messages.delete_many({"group_id": group_id})
-
-    await db.travel_groups.delete_one({"id": group_id})
-
-    return {"message": "Group deleted successfully"}
+    # The group disappears now; its requests and messages are removed in
+    # batches by the background worker.
+    job = await schedule_group_deletion(db, group)
+    message_writer.discard_group(group_id)
+    read_writer.discard_group(group_id)
+    deletion_worker.notify()
+    await response_cache.invalidate_group(group_id)
+    await manager.group_deleted(group_id)
+    recommender.remove_group(group_id)
+
+    return {"message": "Group deleted successfully", "deletion_id": job["id"]}
+
+@api_router.get("/groups/{group_id}/deletion")
+async def get_group_deletion(group_id: str, user_id: str = Depends(get_current_user)):
+    job = await db.group_deletions.find_one({"group_id": group_id, "admin_id": user_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion not found")
+    return job
 
 @api_router.post("/groups/{group_id}/leave")
 async def leave_group(
     group_id: str,
     user_id: str = Depends(get_current_user)
 ):
-    # 1. Group fetch
-    group = await db.travel_groups.find_one({"id": group_id})
-
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-
-    # 2. Check membership
-    if user_id not in group["members"]:
-        raise HTTPException(status_code=400, detail="You are not a member of this group")
-
-    # 3. Admin cannot leave
-    if group["admin_id"] == user_id:
-        raise HTTPException(
-            status_code=400,
-            detail="Admin cannot leave the group. Transfer admin rights first."
-        )
-
-    # 4. Remove user from members
-    await db.travel_groups.update_one(
-        {"id": group_id},
-        {"$pull": {"members": user_id}}
-    )
+    # Membership and admin checks happen inside the update itself
+    await remove_member(db, group_id, user_id)
+    await response_cache.invalidate_group(group_id)
+    await manager.membership_changed(group_id, user_id, False)
+    await recommender.refresh_group(group_id)
 
     return {"message": "You have left the group successfully"}
 
@@ -284,9 +318,17 @@ async def update_group(
 
     # 4. travel_date handling
     if "travel_date" in update_data:
-        update_data["travel_date"] = datetime.fromisoformat(
-            update_data["travel_date"]
-        ).isoformat()
+        update_data["travel_date"] = parse_travel_date(update_data["travel_date"])
+
+    if "trip_type" in update_data:
+        update_data["trip_type"] = update_data["trip_type"].strip().lower()
+
+    # keep search tokens in step with the locations
+    if "from_location" in update_data or "to_location" in update_data:
+        update_data.update(search_fields(
+            update_data.get("from_location", group["from_location"]),
+            update_data.get("to_location", group["to_location"])
+        ))
 
     # 5. image update (optional)
     if "to_location" in update_data:
@@ -301,91 +343,33 @@ async def update_group(
         {"id": group_id},
         {"$set": update_data}
     )
+    await locations.record(update_data)
+
+    await response_cache.invalidate_group(group_id)
+    await recommender.refresh_group(group_id)
 
     updated_group = await db.travel_groups.find_one(
         {"id": group_id},
         {"_id": 0}
     )
 
-    # date conversion
-    if isinstance(updated_group.get("travel_date"), str):
-        updated_group["travel_date"] = datetime.fromisoformat(
-            updated_group["travel_date"]
-        )
-    if isinstance(updated_group.get("created_at"), str):
-        updated_group["created_at"] = datetime.fromisoformat(
-            updated_group["created_at"]
-        )
-
     return updated_group
 
-    destination = group_data.to_location.strip().lower()
-
-    image_url = IMAGE_MAP.get(
-        destination,
-        f"https://source.unsplash.com/1200x600/?{destination},travel&sig={random.randint(1, 100000)}"
-    )
-
-    update_data = {
-        "from_location": group_data.from_location,
-        "to_location": group_data.to_location,
-        "travel_date": datetime.fromisoformat(group_data.travel_date).isoformat(),
-        "budget_min": group_data.budget_min,
-        "budget_max": group_data.budget_max,
-        "trip_type": group_data.trip_type,
-        "description": group_data.description,
-        "max_members": group_data.max_members,
-        "imageUrl": image_url
-    }
-    await db.travel_groups.update_one(
-        {"id": group_id},
-        {"$set": update_data}
-    )
-
-    updated_group = await db.travel_groups.find_one(
-    {"id": group_id},
-    {"_id": 0}
-)
-
-# ✅ safety check (VERY IMPORTANT)
-    if not updated_group:
-        raise HTTPException(status_code=404, detail="Group not found after update")
-
-# travel_date conversion
-    if isinstance(updated_group.get("travel_date"), str):
-        updated_group["travel_date"] = datetime.fromisoformat(
-            updated_group["travel_date"]
-    )
-
-# created_at conversion
-    if isinstance(updated_group.get("created_at"), str):
-        updated_group["created_at"] = datetime.fromisoformat(
-            updated_group["created_at"]
-    )
-        return updated_group
-
-
-
-
 
 @api_router.get("/groups/{group_id}/members", response_model=List[User])
-async def get_group_members(group_id: str):
-    group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-    
-    members = await db.users.find(
-        {"id": {"$in": group['members']}},
-        {"_id": 0, "password": 0}
-    ).to_list(100)
-    
-    for member in members:
-        if isinstance(member.get('created_at'), str):
-            member['created_at'] = datetime.fromisoformat(member['created_at'])
+async def get_group_members(group_id: str, request: Request):
+    async def build():
+        group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0, "members": 1})
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+        
+        members = await fetch_users(db, group['members'], fields=member_list.fields)
+        ordered = [members[member_id] for member_id in group['members'] if member_id in members]
+        return member_list.dump(ordered), {}
     
-    return members
+    return await response_cache.respond(request, members_key(group_id), build)
 
-@api_router.post("/groups/{group_id}/join-request")
+@api_router.post("/groups/{group_id}/join-request", dependencies=[Depends(rate_limiter.limit("join_request", by="user"))])
 async def create_join_request(group_id: str, user_id: str = Depends(get_current_user)):
     group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
     if not group:
@@ -405,56 +389,49 @@ async def create_join_request(group_id: str, user_id: str = Depends(get_current_
         raise HTTPException(status_code=400, detail="Join request already exists")
     
     join_request = JoinRequest(user_id=user_id, group_id=group_id)
-    request_doc = join_request.model_dump()
-    request_doc['created_at'] = request_doc['created_at'].isoformat()
-    
-    await db.join_requests.insert_one(request_doc)
+    await db.join_requests.insert_one(to_document(join_request))
     return {"message": "Join request sent", "request": join_request}
 
 @api_router.get("/groups/{group_id}/join-requests", response_model=List[dict])
-async def get_join_requests(group_id: str, user_id: str = Depends(get_current_user)):
+async def get_join_requests(
+    group_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user)
+):
     group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
     if not group or group['admin_id'] != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    requests = await db.join_requests.find(
+    requests, next_cursor = await fetch_page(
+        db.join_requests,
         {"group_id": group_id, "status": "pending"},
-        {"_id": 0}
-    ).to_list(100)
-    
-    result = []
-    for req in requests:
-        user = await db.users.find_one({"id": req['user_id']}, {"_id": 0, "password": 0})
-        if user:
-            if isinstance(user.get('created_at'), str):
-                user['created_at'] = datetime.fromisoformat(user['created_at'])
-            result.append({"request": req, "user": user})
+        limit, cursor, direction=ASCENDING
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
-    return result
+    return await attach_users(db, requests, "user_id", "request", "user")
 
 @api_router.post("/groups/{group_id}/join-requests/{request_id}/approve")
 async def approve_join_request(group_id: str, request_id: str, user_id: str = Depends(get_current_user)):
-    group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
-    if not group or group['admin_id'] != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    request = await db.join_requests.find_one({"id": request_id}, {"_id": 0})
-    if not request or request['group_id'] != group_id:
+    request = await db.join_requests.find_one({"id": request_id, "group_id": group_id}, {"_id": 0})
+    if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    if len(group['members']) >= group['max_members']:
-        raise HTTPException(status_code=400, detail="Group is full")
+    # Admin and capacity checks are part of the conditional update, so
+    # concurrent approvals cannot overfill the group.
+    await add_member(db, group_id, user_id, request['user_id'])
+    await response_cache.invalidate_group(group_id)
+    await manager.membership_changed(group_id, request['user_id'], True)
+    await recommender.refresh_group(group_id)
     
     await db.join_requests.update_one(
         {"id": request_id},
         {"$set": {"status": "approved"}}
     )
     
-    await db.travel_groups.update_one(
-        {"id": group_id},
-        {"$addToSet": {"members": request['user_id']}}
-    )
-    
     return {"message": "Request approved"}
 
 @api_router.post("/groups/{group_id}/join-requests/{request_id}/reject")
@@ -471,73 +448,193 @@ async def reject_join_request(group_id: str, request_id: str, user_id: str = Dep
     return {"message": "Request rejected"}
 
 @api_router.get("/my-groups", response_model=List[TravelGroup])
-async def get_my_groups(user_id: str = Depends(get_current_user)):
-    groups = await db.travel_groups.find(
-        {"members": user_id},
-        {"_id": 0}
-    ).to_list(100)
+async def get_my_groups(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user)
+):
+    groups, next_cursor = await fetch_page(
+        db.travel_groups, {"members": user_id}, limit, cursor, projection=group_list.projection
+    )
     
-    for group in groups:
-        if isinstance(group.get('travel_date'), str):
-            group['travel_date'] = datetime.fromisoformat(group['travel_date'])
-        if isinstance(group.get('created_at'), str):
-            group['created_at'] = datetime.fromisoformat(group['created_at'])
+    return group_list.response(groups, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+@api_router.get("/dashboard")
+async def get_dashboard(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user)
+):
+    rows, next_cursor = await load_dashboard(db, user_id, limit, cursor, group_list.projection)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
-    return groups
+    return {
+        "groups": rows,
+        "pending_requests_total": sum(row['pending_requests'] or 0 for row in rows),
+    }
 
 @api_router.get("/groups/{group_id}/messages", response_model=List[Message])
-async def get_messages(group_id: str, user_id: str = Depends(get_current_user)):
+async def get_messages(
+    group_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user)
+):
     group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
     if not group or user_id not in group['members']:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    messages = await db.messages.find(
-        {"group_id": group_id},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(1000)
+    # Newest page first; next_cursor walks back through older history.
+    messages, next_cursor = await fetch_page(
+        db.messages, {"group_id": group_id}, limit, cursor, projection=message_list.projection
+    )
+    messages.reverse()
     
-    for msg in messages:
-        if isinstance(msg.get('created_at'), str):
-            msg['created_at'] = datetime.fromisoformat(msg['created_at'])
+    return message_list.response(messages, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+@api_router.get("/groups/{group_id}/messages/export")
+async def export_messages(
+    group_id: str,
+    after_seq: int = Query(0, ge=0),
+    gzip: bool = False,
+    user_id: str = Depends(get_current_user)
+):
+    group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0, "members": 1})
+    if not group or user_id not in group['members']:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    return messages
+    query = {"group_id": group_id, "seq": {"$gt": after_seq}}
+    chunks = iter_ndjson(db.messages, query, message_list, after_seq=after_seq, settled_before=settle_cutoff())
+    filename = f"chat-{group_id}.ndjson"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+    
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def load_missed_messages(group_id: str, last_seen: str, limit: int):
+    """Stored messages after `last_seen`, for ConnectionManager.connect."""
+    anchor = await db.messages.find_one(
+        {"id": last_seen, "group_id": group_id},
+        {"_id": 0, "id": 1, "created_at": 1}
+    )
+    if not anchor:
+        return None
+    
+    # Inclusive of the anchor's millisecond: messages stored in the same
+    # millisecond may sort either side of it. Clients dedupe by id.
+    messages, more = await fetch_page(
+        db.messages,
+        {"group_id": group_id, "created_at": {"$gte": anchor["created_at"]}, "id": {"$ne": last_seen}},
+        limit, direction=ASCENDING, projection=message_list.projection
+    )
+    if more:
+        return None
+    payloads = message_list.dump_each(messages)
+    return [(message["id"], payload.decode()) for message, payload in zip(messages, payloads)]
 
 @api_router.websocket("/ws/{group_id}/{token}")
-async def websocket_endpoint(websocket: WebSocket, group_id: str, token: str):
+async def websocket_endpoint(websocket: WebSocket, group_id: str, token: str, last_seen: Optional[str] = None):
+    connection = None
     try:
         from auth import decode_token
         payload = decode_token(token)
         user_id = payload.get("sub")
         
-        group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0})
-        if not group or user_id not in group['members']:
+        # Sockets already open in this group keep its member ids current,
+        # so the member list is only read for the group's first socket.
+        members_as_of = manager.control_mark()
+        members = ()
+        if manager.is_member(group_id, user_id):
+            group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0, "id": 1})
+        else:
+            group = await db.travel_groups.find_one({"id": group_id}, {"_id": 0, "members": 1})
+            if group and user_id in group['members']:
+                members = group['members']
+            else:
+                group = None
+        if not group:
             await websocket.close(code=1008)
             return
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+        user = await user_cache.get(db, user_id)
+        if not user:
+            await websocket.close(code=1008)
+            return
         
-        await manager.connect(websocket, group_id, user_id)
+        last_seq = await seq_allocator.last_seq(group_id)
+        last_read_seq = await read_writer.last_read_seq(user_id, group_id)
+        read_state = json.dumps({
+            "type": "read_state",
+            "last_seq": last_seq,
+            "last_read_seq": last_read_seq,
+            "unread_count": unread_count(last_seq, last_read_seq),
+        })
         
+        connection = await manager.connect(
+            websocket, group_id, user_id, members=members, members_as_of=members_as_of,
+            last_seen=last_seen, load_missed=load_missed_messages, greeting=read_state
+        )
+        if connection is None:
+            return
+        
+        # Over-limit messages in a row; reset by every accepted one.
+        rejected = 0
         try:
             while True:
                 data = await websocket.receive_text()
+                if not manager.is_member(group_id, user_id):
+                    await websocket.close(code=1008)
+                    break
                 message_data = json.loads(data)
                 
+                # Read receipt from a client showing the chat: {"type": "read", "seq": n}
+                if message_data.get('type') == 'read':
+                    seq = message_data.get('seq')
+                    if isinstance(seq, int) and not isinstance(seq, bool) and seq > 0:
+                        # Markers only move forward, so never past a real message.
+                        read_writer.mark(user_id, group_id, min(seq, await seq_allocator.last_seq(group_id)))
+                    continue
+                
+                retry_after = await rate_limiter.hit("chat_message", user_id)
+                if retry_after:
+                    rejected += 1
+                    if rejected >= WS_MAX_REJECTIONS:
+                        manager.disconnect(connection)
+                        await websocket.close(code=RATE_LIMITED_CLOSE_CODE)
+                        break
+                    manager.notify(connection, {"type": "rate_limited", "retry_after": round(retry_after, 1)})
+                    continue
+                rejected = 0
+                
+                seq = await seq_allocator.next_seq(group_id)
+                if seq is None:
+                    await websocket.close(code=1008)
+                    break
+                
                 message = Message(
                     group_id=group_id,
                     sender_id=user_id,
                     sender_name=user['name'],
-                    content=message_data['content']
+                    content=message_data['content'],
+                    seq=seq
                 )
                 
-                msg_doc = message.model_dump()
-                msg_doc['created_at'] = msg_doc['created_at'].isoformat()
-                await db.messages.insert_one(msg_doc)
-                
+                # Deliver first; storage happens in batches off the critical path.
                 await manager.broadcast(group_id, message.model_dump(mode='json'))
+                await message_writer.write(to_document(message))
+                read_writer.mark(user_id, group_id, seq)
                 
         except WebSocketDisconnect:
-            manager.disconnect(group_id, user_id)
+            pass
+        finally:
+            manager.disconnect(connection)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         try:
@@ -557,12 +654,7 @@ async def create_rating(rating_data: RatingCreate, user_id: str = Depends(get_cu
     if user_id not in group['members'] or rating_data.to_user_id not in group['members']:
         raise HTTPException(status_code=403, detail="Both users must be group members")
     
-    if isinstance(group.get('travel_date'), str):
-        travel_date = datetime.fromisoformat(group['travel_date'])
-    else:
-        travel_date = group['travel_date']
-    
-    if datetime.now(timezone.utc) < travel_date:
+    if datetime.now(timezone.utc) < group['travel_date']:
         raise HTTPException(status_code=400, detail="Cannot rate before trip date")
     
     existing = await db.ratings.find_one(
@@ -584,42 +676,60 @@ async def create_rating(rating_data: RatingCreate, user_id: str = Depends(get_cu
         review=rating_data.review
     )
     
-    rating_doc = rating.model_dump()
-    rating_doc['created_at'] = rating_doc['created_at'].isoformat()
-    await db.ratings.insert_one(rating_doc)
+    try:
+        await db.ratings.insert_one(to_document(rating))
+    except DuplicateKeyError:
+        # A concurrent submit got past the check above first.
+        raise HTTPException(status_code=400, detail="Already rated this user for this trip")
     
-    all_ratings = await db.ratings.find(
-        {"to_user_id": rating_data.to_user_id},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    avg_rating = sum(r['stars'] for r in all_ratings) / len(all_ratings)
-    await db.users.update_one(
-        {"id": rating_data.to_user_id},
-        {"$set": {"average_rating": avg_rating, "total_ratings": len(all_ratings)}}
-    )
+    await apply_rating(db, rating_data.to_user_id, rating_data.stars)
+    user_cache.invalidate(rating_data.to_user_id)
     
     return {"message": "Rating submitted", "rating": rating}
 
 @api_router.get("/users/{user_id}/ratings")
-async def get_user_ratings(user_id: str):
-    ratings = await db.ratings.find(
-        {"to_user_id": user_id},
-        {"_id": 0}
-    ).to_list(100)
-    
-    result = []
-    for rating in ratings:
-        from_user = await db.users.find_one(
-            {"id": rating['from_user_id']},
-            {"_id": 0, "password": 0}
-        )
-        if from_user:
-            if isinstance(from_user.get('created_at'), str):
-                from_user['created_at'] = datetime.fromisoformat(from_user['created_at'])
-            result.append({"rating": rating, "from_user": from_user})
+async def get_user_ratings(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    ratings, next_cursor = await fetch_page(db.ratings, {"to_user_id": user_id}, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    return await attach_users(db, ratings, "from_user_id", "rating", "from_user")
+
+@api_router.get("/recommendations")
+async def get_recommendations(
+    limit: int = Query(10, ge=1, le=50),
+    budget_min: Optional[int] = None,
+    budget_max: Optional[int] = None,
+    trip_type: Optional[str] = None,
+    travel_date: Optional[str] = None,
+    user: dict = Depends(get_current_user_profile)
+):
+    ranked = await recommender.recommend(
+        user, limit,
+        budget_min=budget_min,
+        budget_max=budget_max,
+        trip_type=trip_type,
+        travel_date=parse_travel_date(travel_date) if travel_date else None,
+    )
+    groups = await db.travel_groups.find(
+        {"id": {"$in": [group_id for group_id, _ in ranked]}}, group_list.projection
+    ).to_list(len(ranked))
+    by_id = {group['id']: group for group in groups}
     
-    return result
+    return [
+        {"group": by_id[group_id], "score": round(score, 4)}
+        for group_id, score in ranked if group_id in by_id
+    ]
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 app.include_router(api_router)
 
@@ -629,8 +739,34 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Retry-After"],
 )
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def start_chat_broker():
+    await manager.start()
+    await message_writer.start()
+    await read_writer.start()
+    await seq_allocator.start()
+
+@app.on_event("startup")
+async def start_background_jobs():
+    await deletion_worker.start()
+    await recommender.start()
+    await locations.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await manager.stop()
+    await message_writer.stop()
+    await read_writer.stop()
+    await seq_allocator.stop()
+    await deletion_worker.stop()
+    await recommender.stop()
+    await locations.stop()
     client.close()
\ No newline at end of file
@@ -0,0 +1,56 @@
+import os
+import time
+from collections import OrderedDict
+
+from hydration import PRIVATE_USER_PROJECTION
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class UserCache:
+    """Per-process LRU of user profiles (no private fields) with a TTL.
+
+    Writers that change a profile call invalidate(); the TTL bounds how long
+    another worker can serve the old copy.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation so a lookup that raced with one does
+        # not put the stale document back.
+        self.generation = 0
+
+    async def get(self, db, user_id: str):
+        entry = self.entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(entry[1])
+
+        self.misses += 1
+        generation = self.generation
+        user = await db.users.find_one({"id": user_id}, PRIVATE_USER_PROJECTION)
+        if user is None:
+            self.entries.pop(user_id, None)
+            return None
+        if generation != self.generation:
+            return dict(user)
+
+        self.entries[user_id] = (time.monotonic() + self.ttl, user)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return dict(user)
+
+    def invalidate(self, user_id: str):
+        self.generation += 1
+        self.entries.pop(user_id, None)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
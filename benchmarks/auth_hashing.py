@@ -0,0 +1,80 @@
+"""Event-loop latency while many logins hash/verify passwords at once.
+
+Compares running bcrypt inline in the coroutine (the old behaviour) with the
+thread-pool path in auth.py. A ticker coroutine sleeps for a fixed interval
+and records how late it wakes up; with the pool, that lag should stay flat
+no matter how many logins are in flight.
+
+    python benchmarks/auth_hashing.py --logins 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import auth  # noqa: E402
+
+TICK_SECONDS = 0.005
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+
+
+async def inline_login(password: str, hashed: str):
+    auth.verify_password(password, hashed)
+
+
+async def pooled_login(password: str, hashed: str):
+    await auth.verify_password_async(password, hashed)
+
+
+async def run(mode: str, logins: int, hashed: str) -> dict:
+    login = inline_login if mode == "inline" else pooled_login
+    stop = asyncio.Event()
+    samples = []
+    ticker = asyncio.create_task(measure_lag(stop, samples))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[login("benchmark-password", hashed) for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    samples.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "logins_per_sec": logins / elapsed,
+        "lag_p50_ms": statistics.median(samples),
+        "lag_p99_ms": samples[int(len(samples) * 0.99) - 1] if len(samples) > 1 else samples[0],
+        "lag_max_ms": samples[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    hashed = auth.get_password_hash("benchmark-password")
+    print(f"bcrypt pool: {auth.PASSWORD_HASH_WORKERS} workers")
+    for mode in ("inline", "pool"):
+        result = asyncio.run(run(mode, args.logins, hashed))
+        print(
+            f"{result['mode']:>6}: {result['logins']} logins, {result['logins_per_sec']:.1f}/s, "
+            f"loop lag p50 {result['lag_p50_ms']:.1f} ms, p99 {result['lag_p99_ms']:.1f} ms, "
+            f"max {result['lag_max_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Per-request auth overhead of decode_token.
+
+Times python-jose and PyJWT verification of the same HS256 token, and the
+cached path auth.decode_token takes for a token it has already verified.
+
+    python benchmarks/jwt_decode.py --iterations 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import jwt as pyjwt  # noqa: E402
+from jose import jwt as jose_jwt  # noqa: E402
+
+import auth  # noqa: E402
+
+
+def time_per_call(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = auth.create_access_token(data={"sub": "benchmark-user"})
+    key = auth.SECRET_KEY
+    key_bytes = key.encode()
+
+    cases = {
+        "python-jose decode": lambda: jose_jwt.decode(token, key, algorithms=[auth.ALGORITHM]),
+        "PyJWT decode": lambda: pyjwt.decode(token, key_bytes, algorithms=[auth.ALGORITHM]),
+        "decode_token (cached)": lambda: auth.decode_token(token),
+    }
+    auth.decode_token(token)
+
+    for name, func in cases.items():
+        print(f"{name:>22}: {time_per_call(func, args.iterations):8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""Load test for the REST and websocket APIs.
+
+Starts the app with uvicorn on a local port and drives it with concurrent
+clients through a full session:
+
+  signup, login        every benchmark user
+  create_group         one group per --members-per-group users
+  join_request         everyone else asks to join their group
+  list_join_requests   admins load their pending requests
+  approve              admins approve them
+  search               group search with a mix of filters and sorts
+  ws_fanout            --members-per-group sockets per group, admins send
+                       --messages each; latency is send to receipt at
+                       every member
+  message_history      members page through the chat history
+  dashboard            every user loads /dashboard (skipped with --mock:
+                       mongomock has no $lookup sub-pipelines)
+
+Per step it reports p50/p95/p99 latency and requests/sec (deliveries/sec
+for ws_fanout), and writes them to a JSON results file. Pass an earlier
+file to --compare to see the change between commits, and --budget to
+fail the run when a step's p95 exceeds a latency budget:
+
+    python benchmarks/load_test.py --mock
+    python benchmarks/load_test.py --mock --compare benchmarks/results/<commit>.json
+    python benchmarks/load_test.py --budget dashboard=50 --budget search=100
+
+--mock runs the app on mongomock-motor. Without it the app connects to
+MONGO_URL and uses a throwaway database that is dropped afterwards; point
+it at an ephemeral mongod for numbers that mean anything about queries.
+Needs httpx, and mongomock-motor for --mock (both pinned in
+backend/requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+from websockets.asyncio.client import connect as ws_connect  # noqa: E402
+
+CITIES = ["New Delhi", "Mumbai", "Pune", "Bengaluru", "Jaipur", "Kolkata"]
+DESTINATIONS = ["Manali", "Goa", "Kasol", "Rishikesh", "Leh", "Munnar", "Coorg", "Udaipur"]
+TRIP_TYPES = ["adventure", "leisure", "backpacking", "spiritual"]
+
+
+class Step:
+    def __init__(self, name: str):
+        self.name = name
+        self.samples = []
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> dict:
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] * 1000
+
+        return {
+            "count": len(samples),
+            "errors": self.errors,
+            "rps": len(samples) / self.elapsed if self.elapsed else 0.0,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "max_ms": samples[-1] * 1000 if samples else 0.0,
+        }
+
+
+async def run_step(step: Step, calls: list, concurrency: int):
+    """Await every call with at most `concurrency` in flight, timing each."""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(calls)
+
+    async def timed(index, call):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                results[index] = result = await call()
+                if isinstance(result, httpx.Response) and result.is_error:
+                    raise httpx.HTTPStatusError(
+                        f"{result.status_code} from {result.request.url.path}",
+                        request=result.request, response=result
+                    )
+            except Exception as e:
+                step.errors += 1
+                if step.errors <= 3:
+                    print(f"  {step.name} error: {e!r}")
+                return
+            step.samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(i, call) for i, call in enumerate(calls)))
+    step.elapsed = time.perf_counter() - started
+    return results
+
+
+def checked(response: httpx.Response) -> httpx.Response:
+    response.raise_for_status()
+    return response
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(mock: bool, db_name: str, port: int):
+    os.environ["DB_NAME"] = db_name
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    # Every benchmark user comes from one address and sends in bursts, so
+    # the per-IP and per-user limits would turn most steps into 429s.
+    for rule in ("LOGIN", "SIGNUP", "JOIN_REQUEST", "CHAT_MESSAGE"):
+        os.environ.setdefault(f"RATE_LIMIT_{rule}", "off")
+    if mock:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import uvicorn
+    import server
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app_server = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=app_server.run, daemon=True)
+    thread.start()
+    while not app_server.started:
+        if not thread.is_alive():
+            raise RuntimeError("App failed to start")
+        time.sleep(0.05)
+    return app_server, thread
+
+
+def stop_app(app_server, thread):
+    app_server.should_exit = True
+    thread.join(timeout=30)
+
+
+async def drop_database(db_name: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        await client.drop_database(db_name)
+    finally:
+        client.close()
+
+
+def group_payload() -> dict:
+    return {
+        "from_location": random.choice(CITIES),
+        "to_location": random.choice(DESTINATIONS),
+        "travel_date": (datetime.now(timezone.utc) + timedelta(days=random.randint(1, 120))).isoformat(),
+        "budget_min": random.choice([2000, 5000, 8000]),
+        "budget_max": random.choice([10000, 15000, 25000]),
+        "trip_type": random.choice(TRIP_TYPES),
+        "description": "Benchmark trip",
+        "max_members": 1000,
+    }
+
+
+def search_params() -> dict:
+    params = random.choice([
+        {},
+        {"to_location": random.choice(DESTINATIONS)[:3]},
+        {"from_location": random.choice(CITIES).split()[0]},
+        {"trip_type": random.choice(TRIP_TYPES), "sort": "date"},
+        {"budget_min": 4000, "budget_max": 12000},
+        {"date_from": datetime.now(timezone.utc).date().isoformat(), "sort": "date"},
+    ])
+    return {**params, "limit": 20}
+
+
+async def fanout(args, ws_url: str, groups: list, step: Step):
+    """Connect every member, then have each admin send args.messages messages."""
+    expected = {}
+    received = asyncio.Event()
+    pending = [0]
+
+    async def listen(socket_):
+        async for raw in socket_:
+            message = json.loads(raw)
+            if "type" in message:
+                continue
+            sent_at = expected.get(message["content"])
+            if sent_at is None:
+                continue
+            step.samples.append(time.perf_counter() - sent_at)
+            pending[0] -= 1
+            if pending[0] <= 0:
+                received.set()
+
+    sockets, listeners = [], []
+    for group in groups:
+        for member in group["members"]:
+            socket_ = await ws_connect(f"{ws_url}/api/ws/{group['id']}/{member['token']}")
+            sockets.append(socket_)
+            listeners.append(asyncio.create_task(listen(socket_)))
+    admin_sockets = {
+        group["id"]: sockets[index * len(group["members"])]
+        for index, group in enumerate(groups)
+    }
+
+    pending[0] = sum(len(group["members"]) for group in groups) * args.messages
+    started = time.perf_counter()
+    for n in range(args.messages):
+        for group in groups:
+            content = f"bench {group['id']} {n}"
+            expected[content] = time.perf_counter()
+            await admin_sockets[group["id"]].send(json.dumps({"content": content}))
+        await asyncio.sleep(args.message_interval)
+    try:
+        await asyncio.wait_for(received.wait(), 30)
+    except asyncio.TimeoutError:
+        step.errors += pending[0]
+    step.elapsed = time.perf_counter() - started
+
+    for task in listeners:
+        task.cancel()
+    for socket_ in sockets:
+        await socket_.close()
+
+
+async def run(args, base_url: str, ws_url: str) -> dict:
+    steps = {}
+
+    def step(name):
+        steps[name] = Step(name)
+        return steps[name]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"{base_url}/api", limits=limits, timeout=60) as http:
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            {"name": f"Bench {n}", "email": f"bench-{run_id}-{n}@example.com", "password": "bench-pass",
+             "city": random.choice(CITIES), "age": random.randint(18, 60)}
+            for n in range(args.groups * args.members_per_group)
+        ]
+
+        signups = await run_step(step("signup"), [
+            lambda user=user: http.post("/auth/signup", json=user) for user in users
+        ], args.concurrency)
+        for user, response in zip(users, signups):
+            user["id"] = checked(response).json()["user"]["id"]
+
+        logins = await run_step(step("login"), [
+            lambda user=user: http.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+            for user in users
+        ], args.concurrency)
+        for user, response in zip(users, logins):
+            user["token"] = checked(response).json()["token"]
+            user["headers"] = {"Authorization": f"Bearer {user['token']}"}
+
+        size = args.members_per_group
+        groups = [{"members": users[i * size:(i + 1) * size]} for i in range(args.groups)]
+        created = await run_step(step("create_group"), [
+            lambda group=group: http.post("/groups", json=group_payload(), headers=group["members"][0]["headers"])
+            for group in groups
+        ], args.concurrency)
+        for group, response in zip(groups, created):
+            group["id"] = checked(response).json()["id"]
+
+        await run_step(step("join_request"), [
+            lambda group=group, member=member: http.post(
+                f"/groups/{group['id']}/join-request", headers=member["headers"])
+            for group in groups for member in group["members"][1:]
+        ], args.concurrency)
+
+        listed = await run_step(step("list_join_requests"), [
+            lambda group=group: http.get(
+                f"/groups/{group['id']}/join-requests", headers=group["members"][0]["headers"],
+                params={"limit": 200})
+            for group in groups
+        ], args.concurrency)
+        await run_step(step("approve"), [
+            lambda group=group, row=row: http.post(
+                f"/groups/{group['id']}/join-requests/{row['request']['id']}/approve",
+                headers=group["members"][0]["headers"])
+            for group, response in zip(groups, listed)
+            for row in checked(response).json()
+        ], args.concurrency)
+
+        await run_step(step("search"), [
+            lambda: http.get("/groups", params=search_params()) for _ in range(args.searches)
+        ], args.concurrency)
+
+        await fanout(args, ws_url, groups, step("ws_fanout"))
+        # Let the write-behind buffer flush before reading history back.
+        await asyncio.sleep(0.5)
+
+        async def read_history(group, member):
+            cursor, pages = None, 0
+            while True:
+                params = {"limit": args.history_page_size, **({"cursor": cursor} if cursor else {})}
+                response = checked(await http.get(
+                    f"/groups/{group['id']}/messages", headers=member["headers"], params=params))
+                pages += 1
+                cursor = response.headers.get("x-next-cursor")
+                if not cursor:
+                    return pages
+
+        await run_step(step("message_history"), [
+            lambda group=group, member=member: read_history(group, member)
+            for group in groups for member in group["members"][:args.history_readers]
+        ], args.concurrency)
+
+        if args.mock:
+            print("  dashboard skipped: mongomock does not implement $lookup sub-pipelines")
+        else:
+            await run_step(step("dashboard"), [
+                lambda user=user: http.get("/dashboard", headers=user["headers"]) for user in users
+            ], args.concurrency)
+
+    return {name: s.summary() for name, s in steps.items()}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'step':>20} {'count':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'p95 vs base':>12} {'rps vs base':>12}"
+    print(header)
+    for name, row in results.items():
+        line = (f"{name:>20} {row['count']:>7} {row['errors']:>5} {row['rps']:>9.1f} "
+                f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+        base = (baseline or {}).get(name)
+        if base:
+            def change(new, old):
+                return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            line += f" {change(row['p95_ms'], base['p95_ms']):>12} {change(row['rps'], base['rps']):>12}"
+        print(line)
+
+
+def budget_violations(results: dict, budgets: list) -> list:
+    violations = []
+    for budget in budgets:
+        name, _, limit = budget.partition("=")
+        row = results.get(name)
+        if row is None:
+            violations.append(f"{name}: no results")
+        elif row["p95_ms"] > float(limit):
+            violations.append(f"{name}: p95 {row['p95_ms']:.2f} ms over budget of {float(limit):.2f} ms")
+        elif row["errors"]:
+            violations.append(f"{name}: {row['errors']} errors")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mock", action="store_true")
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--members-per-group", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=20, help="messages each admin sends")
+    parser.add_argument("--message-interval", type=float, default=0.01)
+    parser.add_argument("--searches", type=int, default=500)
+    parser.add_argument("--history-readers", type=int, default=3, help="members per group reading history")
+    parser.add_argument("--history-page-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--budget", action="append", default=[], metavar="STEP=MS",
+                        help="fail if STEP's p95 latency exceeds MS; repeatable")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    db_name = f"chalboo_bench_{uuid.uuid4().hex[:8]}"
+    port = free_port()
+    app_server, thread = start_app(args.mock, db_name, port)
+    try:
+        results = asyncio.run(run(args, f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}"))
+    finally:
+        stop_app(app_server, thread)
+        if not args.mock:
+            asyncio.run(drop_database(db_name))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "mock": args.mock,
+            "args": vars(args),
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+    violations = budget_violations(results, args.budget)
+    for violation in violations:
+        print(f"BUDGET EXCEEDED {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
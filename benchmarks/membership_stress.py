@@ -0,0 +1,88 @@
+"""Concurrency stress test for membership approvals.
+
+Fires many approvals at the same small groups in parallel and checks that
+no group ends up with more members than max_members and that member_count
+always equals len(members). Point it at a throwaway database:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/membership_stress.py
+
+--mock runs against mongomock-motor instead; that only checks the logic,
+since mongomock serializes every operation.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi import HTTPException  # noqa: E402
+
+from membership import add_member  # noqa: E402
+
+
+def connect(mock: bool):
+    if mock:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient(tz_aware=True)
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), tz_aware=True)
+    return client, client[f"chalboo_stress_{uuid.uuid4().hex[:8]}"]
+
+
+async def approve(db, group_id: str, admin_id: str, user_id: str) -> bool:
+    try:
+        await add_member(db, group_id, admin_id, user_id)
+        return True
+    except HTTPException:
+        return False
+
+
+async def run(args) -> int:
+    client, db = connect(args.mock)
+    try:
+        groups = [
+            {"id": str(uuid.uuid4()), "admin_id": "admin", "members": ["admin"],
+             "member_count": 1, "max_members": args.max_members}
+            for _ in range(args.groups)
+        ]
+        await db.travel_groups.insert_many(groups)
+
+        tasks = [
+            approve(db, group["id"], "admin", f"user-{n}")
+            for group in groups
+            for n in range(args.applicants)
+        ]
+        started = time.perf_counter()
+        results = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        violations = 0
+        async for group in db.travel_groups.find({}, {"_id": 0}):
+            if len(group["members"]) > group["max_members"] or group["member_count"] != len(group["members"]):
+                violations += 1
+                print(f"VIOLATION {group['id']}: {len(group['members'])} members, "
+                      f"member_count {group['member_count']}, max {group['max_members']}")
+
+        print(f"{len(tasks)} approvals in {elapsed:.2f}s ({len(tasks) / elapsed:.0f}/s), "
+              f"{sum(results)} accepted, {violations} groups violating the invariant")
+        return 1 if violations else 0
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--applicants", type=int, default=50)
+    parser.add_argument("--max-members", type=int, default=5)
+    parser.add_argument("--mock", action="store_true")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Scoring cost of the recommendation matrix.
+
+Fills a FeatureMatrix with synthetic upcoming groups and times one
+GroupRecommender.score pass plus the top-k selection that /recommendations
+does per request.
+
+    python benchmarks/recommendations.py --groups 100000 --repeat 50
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import numpy as np  # noqa: E402
+
+from recommendations import FeatureMatrix, GroupRecommender  # noqa: E402
+
+
+def build_matrix(count: int, rng) -> FeatureMatrix:
+    matrix = FeatureMatrix()
+    now = datetime.now(timezone.utc).timestamp()
+    budget_min = rng.integers(1000, 50000, count)
+    for n in range(count):
+        matrix.upsert(f"group-{n}", {
+            "budget_min": budget_min[n],
+            "budget_max": budget_min[n] + rng.integers(1000, 50000),
+            "travel_ts": now + rng.uniform(0, 180) * 86400,
+            "mean_age": rng.uniform(18, 60),
+            "mean_rating": rng.uniform(1, 5),
+            "rated_members": rng.integers(0, 5),
+            "member_count": rng.integers(1, 10),
+            "max_members": 10,
+            "origin": rng.integers(0, 50),
+            "trip_type": rng.integers(0, 6),
+        })
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    started = time.perf_counter()
+    matrix = build_matrix(args.groups, rng)
+    print(f"built {matrix.size} rows in {time.perf_counter() - started:.1f}s")
+
+    recommender = GroupRecommender(db=None)
+    prefs = {"budget_min": 5000, "budget_max": 15000, "trip_type": 2, "travel_ts": None, "age": 27, "origin": 7}
+    now = datetime.now(timezone.utc).timestamp()
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        scores = recommender.score(matrix, prefs, now)
+        top = np.argpartition(-scores, args.limit - 1)[:args.limit]
+        top[np.argsort(-scores[top])]
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    print(f"score + top-{args.limit} over {matrix.size} groups: "
+          f"p50 {timings[len(timings) // 2] * 1000:.2f} ms, max {timings[-1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
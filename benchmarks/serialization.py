@@ -0,0 +1,106 @@
+"""Cost of encoding list responses, per 1000 documents.
+
+Compares three ways of turning stored message and group documents into a
+response body:
+
+  fastapi       what a response_model endpoint does: validate each document,
+                jsonable_encoder, then stdlib json.dumps
+  validated     serialization.ListSerializer default: TypeAdapter validate
+                plus pydantic's dump_json
+  fast          serialization.ListSerializer(fast=True): orjson on the raw
+                documents (FAST_JSON_RESPONSES=true)
+
+    python benchmarks/serialization.py --docs 1000 --repeat 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from codec import to_document  # noqa: E402
+from models import Message, TravelGroup  # noqa: E402
+from serialization import ListSerializer  # noqa: E402
+
+
+def make_messages(count: int) -> list:
+    group_id = str(uuid.uuid4())
+    senders = [str(uuid.uuid4()) for _ in range(10)]
+    start = datetime.now(timezone.utc)
+    return [
+        to_document(Message(
+            group_id=group_id,
+            sender_id=senders[i % len(senders)],
+            sender_name=f"Traveller {i % len(senders)}",
+            content=f"Message number {i}, meet at the station at {i % 24}:00?",
+            created_at=start + timedelta(seconds=i),
+        ))
+        for i in range(count)
+    ]
+
+
+def make_groups(count: int) -> list:
+    start = datetime.now(timezone.utc)
+    return [
+        to_document(TravelGroup(
+            from_location="New Delhi",
+            to_location="Manali",
+            travel_date=start + timedelta(days=i % 90),
+            budget_min=5000,
+            budget_max=15000,
+            trip_type="adventure",
+            description="Road trip through the mountains, sharing fuel and stays.",
+            max_members=8,
+            admin_id=str(uuid.uuid4()),
+            members=[str(uuid.uuid4()) for _ in range(1 + i % 8)],
+            member_count=1 + i % 8,
+        ))
+        for i in range(count)
+    ]
+
+
+def fastapi_encoder(model):
+    adapter = TypeAdapter(List[model])
+
+    def encode(docs):
+        return json.dumps(jsonable_encoder(adapter.validate_python(docs))).encode()
+    return encode
+
+
+def time_per_1k(func, docs: list, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(docs)
+    return (time.perf_counter() - started) / repeat / len(docs) * 1000 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, model, docs in (
+        ("messages", Message, make_messages(args.docs)),
+        ("groups", TravelGroup, make_groups(args.docs)),
+    ):
+        cases = {
+            "fastapi": fastapi_encoder(model),
+            "validated": ListSerializer(model, fast=False).dump,
+            "fast": ListSerializer(model, fast=True).dump,
+        }
+        print(f"{name} ({args.docs} docs, {len(cases['fast'](docs)) / 1024:.0f} KiB):")
+        for case, func in cases.items():
+            print(f"{case:>12}: {time_per_1k(func, docs, args.repeat):8.2f} ms per 1k docs")
+
+
+if __name__ == "__main__":
+    main()
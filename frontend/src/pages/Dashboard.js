@@ -21,6 +21,9 @@ export default function Dashboard() {
     travel_date: ''
   });
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [lastParams, setLastParams] = useState({});
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     searchGroups();
@@ -36,6 +39,8 @@ export default function Dashboard() {
 
       const response = await axios.get(`${API_URL}/groups`, { params });
       setGroups(response.data);
+      setLastParams(params);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to fetch groups');
     } finally {
@@ -43,6 +48,23 @@ export default function Dashboard() {
     }
   };
 
+  // Next page of the last search, not of whatever is typed in the form now.
+  const loadMoreGroups = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(`${API_URL}/groups`, {
+        params: { ...lastParams, cursor: nextCursor }
+      });
+      setGroups((prev) => [...prev, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast.error('Failed to fetch more groups');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-background">
       <Navbar />
@@ -112,6 +134,7 @@ export default function Dashboard() {
             </Button>
           </Card>
         ) : (
+          <>
           <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-6">
             {groups.map((group) => (
               <Card
@@ -156,6 +179,20 @@ export default function Dashboard() {
               </Card>
             ))}
           </div>
+          {nextCursor && (
+            <div className="text-center mt-8">
+              <Button
+                variant="outline"
+                onClick={loadMoreGroups}
+                disabled={loadingMore}
+                data-testid="load-more-groups-btn"
+                className="border-2 rounded-full px-8 font-bold"
+              >
+                {loadingMore ? 'Loading...' : 'Load more groups'}
+              </Button>
+            </div>
+          )}
+          </>
         )}
       </div>
     </div>
@@ -12,6 +12,8 @@ import Navbar from '../components/Navbar';
 
 const API_URL = `${process.env.REACT_APP_BACKEND_URL}/api`;
 const WS_URL = process.env.REACT_APP_BACKEND_URL.replace('https://', 'wss://').replace('http://', 'ws://');
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 30000;
 
 export default function GroupChat() {
   const { groupId } = useParams();
@@ -20,20 +22,49 @@ export default function GroupChat() {
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
   const [ws, setWs] = useState(null);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
+  const wsRef = useRef(null);
+  const lastSeenRef = useRef(null);
+  const reconnectDelayRef = useRef(RECONNECT_BASE_MS);
+  const reconnectTimerRef = useRef(null);
+  const unmountedRef = useRef(false);
+  const maxSeqRef = useRef(0);
+  const lastAckedSeqRef = useRef(0);
 
   useEffect(() => {
+    unmountedRef.current = false;
+    lastSeenRef.current = null;
+    maxSeqRef.current = 0;
+    lastAckedSeqRef.current = 0;
     fetchMessages();
     connectWebSocket();
+    document.addEventListener('visibilitychange', acknowledgeRead);
 
     return () => {
-      if (ws) {
-        ws.close();
+      unmountedRef.current = true;
+      document.removeEventListener('visibilitychange', acknowledgeRead);
+      clearTimeout(reconnectTimerRef.current);
+      if (wsRef.current) {
+        wsRef.current.close();
       }
     };
   }, [groupId]);
 
   useEffect(() => {
+    // The newest message we hold; sent on reconnect so the server replays
+    // only what we missed.
+    if (messages.length > 0) {
+      lastSeenRef.current = messages[messages.length - 1].id;
+    }
+    maxSeqRef.current = messages.reduce((max, m) => Math.max(max, m.seq || 0), 0);
+    acknowledgeRead();
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -47,31 +78,88 @@ export default function GroupChat() {
         headers: { Authorization: `Bearer ${token}` }
       });
       setMessages(response.data);
+      setOlderCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to load messages');
     }
   };
 
+  const fetchOlderMessages = async () => {
+    if (!olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const response = await axios.get(`${API_URL}/groups/${groupId}/messages`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { cursor: olderCursor }
+      });
+      skipScrollRef.current = true;
+      setMessages((prev) => [...response.data, ...prev]);
+      setOlderCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast.error('Failed to load older messages');
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  // Tell the server how far we have read, while the chat is actually visible.
+  const acknowledgeRead = () => {
+    const socket = wsRef.current;
+    if (!socket || socket.readyState !== WebSocket.OPEN || document.visibilityState !== 'visible') return;
+    const seq = maxSeqRef.current;
+    if (seq > lastAckedSeqRef.current) {
+      lastAckedSeqRef.current = seq;
+      socket.send(JSON.stringify({ type: 'read', seq }));
+    }
+  };
+
   const connectWebSocket = () => {
-    const websocket = new WebSocket(`${WS_URL}/api/ws/${groupId}/${token}`);
+    const query = lastSeenRef.current ? `?last_seen=${encodeURIComponent(lastSeenRef.current)}` : '';
+    const websocket = new WebSocket(`${WS_URL}/api/ws/${groupId}/${token}${query}`);
 
     websocket.onopen = () => {
       console.log('WebSocket connected');
+      reconnectDelayRef.current = RECONNECT_BASE_MS;
+      lastAckedSeqRef.current = 0;
+      acknowledgeRead();
     };
 
     websocket.onmessage = (event) => {
       const message = JSON.parse(event.data);
-      setMessages((prev) => [...prev, message]);
+      if (message.type === 'resync') {
+        // The gap was too large to replay: reload the latest page instead.
+        fetchMessages();
+        return;
+      }
+      if (message.type === 'rate_limited') {
+        // The server dropped our last message.
+        toast.error(`You're sending messages too fast. Try again in ${Math.ceil(message.retry_after)}s.`);
+        return;
+      }
+      if (message.type) {
+        // Other control frames (read_state) carry nothing the chat view shows.
+        return;
+      }
+      // Replayed messages can overlap what we already have.
+      setMessages((prev) => (prev.some((m) => m.id === message.id) ? prev : [...prev, message]));
     };
 
     websocket.onerror = (error) => {
       console.error('WebSocket error:', error);
     };
 
-    websocket.onclose = () => {
+    websocket.onclose = (event) => {
       console.log('WebSocket disconnected');
+      // 1008: not a member (any more); reconnecting would not help.
+      // 4000: this chat was opened again elsewhere (another tab).
+      if (unmountedRef.current || wsRef.current !== websocket || event.code === 1008 || event.code === 4000) return;
+      // Jittered backoff so a server restart does not get every client back at once.
+      const delay = reconnectDelayRef.current * (0.5 + Math.random() / 2);
+      reconnectDelayRef.current = Math.min(reconnectDelayRef.current * 2, RECONNECT_MAX_MS);
+      reconnectTimerRef.current = setTimeout(connectWebSocket, delay);
     };
 
+    wsRef.current = websocket;
     setWs(websocket);
   };
 
@@ -102,6 +190,18 @@ export default function GroupChat() {
 
         <Card className="flex-1 border-2 border-border rounded-xl flex flex-col overflow-hidden" data-testid="chat-container">
           <div className="flex-1 overflow-y-auto p-6 space-y-4">
+            {olderCursor && (
+              <div className="text-center">
+                <Button
+                  variant="ghost"
+                  onClick={fetchOlderMessages}
+                  disabled={loadingOlder}
+                  data-testid="load-older-messages-btn"
+                >
+                  {loadingOlder ? 'Loading...' : 'Load older messages'}
+                </Button>
+              </div>
+            )}
             {messages.length === 0 ? (
               <div className="text-center text-muted-foreground py-20">
                 No messages yet. Start the conversation!
@@ -18,6 +18,8 @@ export default function GroupDetail() {
   const [group, setGroup] = useState(null);
   const [members, setMembers] = useState([]);
   const [requests, setRequests] = useState([]);
+  const [requestsCursor, setRequestsCursor] = useState(null);
+  const [loadingMoreRequests, setLoadingMoreRequests] = useState(false);
   const [loading, setLoading] = useState(true);
   const [isMember, setIsMember] = useState(false);
   const [isAdmin, setIsAdmin] = useState(false);
@@ -41,6 +43,7 @@ export default function GroupDetail() {
       if (groupRes.data.admin_id === user.id) {
         const requestsRes = await axios.get(`${API_URL}/groups/${groupId}/join-requests`, getAuthHeader());
         setRequests(requestsRes.data);
+        setRequestsCursor(requestsRes.headers['x-next-cursor'] || null);
       }
     } catch (error) {
       toast.error('Failed to load group');
@@ -49,6 +52,23 @@ export default function GroupDetail() {
     }
   };
 
+  const loadMoreRequests = async () => {
+    if (!requestsCursor || loadingMoreRequests) return;
+    setLoadingMoreRequests(true);
+    try {
+      const response = await axios.get(`${API_URL}/groups/${groupId}/join-requests`, {
+        ...getAuthHeader(),
+        params: { cursor: requestsCursor }
+      });
+      setRequests((prev) => [...prev, ...response.data]);
+      setRequestsCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast.error('Failed to load more requests');
+    } finally {
+      setLoadingMoreRequests(false);
+    }
+  };
+
   const handleJoinRequest = async () => {
     try {
       await axios.post(`${API_URL}/groups/${groupId}/join-request`, {}, getAuthHeader());
@@ -255,7 +275,7 @@ export default function GroupDetail() {
 
           {isAdmin && requests.length > 0 && (
             <div className="mt-8">
-              <h3 className="font-heading font-bold text-xl mb-4">Pending Requests ({requests.length})</h3>
+              <h3 className="font-heading font-bold text-xl mb-4">Pending Requests ({requests.length}{requestsCursor ? '+' : ''})</h3>
               <div className="space-y-3">
                 {requests.map(({ request, user: reqUser }) => (
                   <Card key={request.id} className="p-4 border border-border flex items-center justify-between">
@@ -283,6 +303,18 @@ export default function GroupDetail() {
                   </Card>
                 ))}
               </div>
+              {requestsCursor && (
+                <div className="text-center mt-4">
+                  <Button
+                    variant="ghost"
+                    onClick={loadMoreRequests}
+                    disabled={loadingMoreRequests}
+                    data-testid="load-more-requests-btn"
+                  >
+                    {loadingMoreRequests ? 'Loading...' : 'Load more requests'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </Card>
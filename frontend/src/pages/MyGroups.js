@@ -1,11 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
 import { toast } from 'sonner';
+import { Button } from '../components/ui/button';
 import { Card } from '../components/ui/card';
 import { Badge } from '../components/ui/badge';
-import { MapPin, Calendar, Users } from 'lucide-react';
+import { MapPin, Calendar, Users, MessageCircle } from 'lucide-react';
 import Navbar from '../components/Navbar';
 
 const API_URL = `${process.env.REACT_APP_BACKEND_URL}/api`;
@@ -13,17 +14,47 @@ const API_URL = `${process.env.REACT_APP_BACKEND_URL}/api`;
 export default function MyGroups() {
   const navigate = useNavigate();
   const { getAuthHeader } = useAuth();
-  const [groups, setGroups] = useState([]);
+  const [rows, setRows] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // /dashboard needs MongoDB 5.0+; without it, list the groups from
+  // /my-groups, which pages with the same cursors, minus the extras.
+  const fallbackRef = useRef(false);
 
   useEffect(() => {
     fetchMyGroups();
   }, []);
 
+  const fetchPage = async (cursor) => {
+    const config = { ...getAuthHeader(), params: cursor ? { cursor } : {} };
+    if (!fallbackRef.current) {
+      try {
+        const response = await axios.get(`${API_URL}/dashboard`, config);
+        return { rows: response.data.groups, next: response.headers['x-next-cursor'] || null };
+      } catch (error) {
+        if (!(error.response?.status >= 500)) throw error;
+        fallbackRef.current = true;
+      }
+    }
+    const response = await axios.get(`${API_URL}/my-groups`, config);
+    return {
+      rows: response.data.map((group) => ({
+        group,
+        pending_requests: null,
+        message_count: group.last_seq,
+        unread_count: 0,
+        last_message: null,
+      })),
+      next: response.headers['x-next-cursor'] || null,
+    };
+  };
+
   const fetchMyGroups = async () => {
     try {
-      const response = await axios.get(`${API_URL}/my-groups`, getAuthHeader());
-      setGroups(response.data);
+      const page = await fetchPage(null);
+      setRows(page.rows);
+      setNextCursor(page.next);
     } catch (error) {
       toast.error('Failed to fetch your groups');
     } finally {
@@ -31,6 +62,20 @@ export default function MyGroups() {
     }
   };
 
+  const loadMoreGroups = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setRows((prev) => [...prev, ...page.rows]);
+      setNextCursor(page.next);
+    } catch (error) {
+      toast.error('Failed to fetch more of your groups');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-background">
       <Navbar />
@@ -41,13 +86,14 @@ export default function MyGroups() {
 
         {loading ? (
           <div className="text-center py-20">Loading...</div>
-        ) : groups.length === 0 ? (
+        ) : rows.length === 0 ? (
           <Card className="p-12 text-center border-2 border-dashed border-border rounded-xl">
             <p className="text-xl text-muted-foreground">You haven't joined any groups yet</p>
           </Card>
         ) : (
+          <>
           <div className="grid md:grid-cols-2 lg:grid-cols-3 gap-6" data-testid="my-groups-list">
-            {groups.map((group) => (
+            {rows.map(({ group, pending_requests, message_count, unread_count, last_message }) => (
               <Card
                 key={group.id}
                 className="overflow-hidden border-2 border-border rounded-xl hover:border-primary transition-all cursor-pointer hover:shadow-lg"
@@ -77,15 +123,47 @@ export default function MyGroups() {
                     <Users className="w-4 h-4" />
                     <span>{group.members.length}/{group.max_members} members</span>
                   </div>
-                  <div className="pt-2">
+                  <div className="flex items-center gap-2 text-sm text-muted-foreground">
+                    <MessageCircle className="w-4 h-4" />
+                    <span className="truncate" data-testid={`my-group-last-message-${group.id}`}>
+                      {last_message ? `${last_message.sender_name}: ${last_message.content}` : 'No messages yet'}
+                    </span>
+                    {unread_count > 0 ? (
+                      <Badge className="bg-primary text-white" data-testid={`my-group-unread-${group.id}`}>
+                        {unread_count} new
+                      </Badge>
+                    ) : (
+                      message_count > 0 && <span className="font-mono">({message_count})</span>
+                    )}
+                  </div>
+                  <div className="pt-2 flex gap-2">
                     <Badge className="bg-accent/20 text-accent-foreground">
                       {group.trip_type}
                     </Badge>
+                    {pending_requests > 0 && (
+                      <Badge className="bg-primary text-white" data-testid={`my-group-pending-${group.id}`}>
+                        {pending_requests} pending {pending_requests === 1 ? 'request' : 'requests'}
+                      </Badge>
+                    )}
                   </div>
                 </div>
               </Card>
             ))}
           </div>
+          {nextCursor && (
+            <div className="text-center mt-8">
+              <Button
+                variant="outline"
+                onClick={loadMoreGroups}
+                disabled={loadingMore}
+                data-testid="load-more-my-groups-btn"
+                className="border-2 rounded-full px-8 font-bold"
+              >
+                {loadingMore ? 'Loading...' : 'Load more groups'}
+              </Button>
+            </div>
+          )}
+          </>
         )}
       </div>
     </div>
@@ -0,0 +1,42 @@
+import asyncio
+import inspect
+import os
+import random
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+@pytest.fixture
+def db():
+    """A fresh mongomock-motor database, shared by everything in one test."""
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient(tz_aware=True)["chalboo_test"]
+
+
+@pytest.fixture
+def interleaved(monkeypatch):
+    """Make every collection call yield to the event loop a few times.
+
+    mongomock answers synchronously, so without this a task never gives way
+    between two calls and concurrency tests would pass trivially. The
+    number of yields varies (reproducibly) so calls complete out of order,
+    as replies from a real server would.
+    """
+    from mongomock_motor import AsyncMongoMockCollection
+
+    rng = random.Random(0)
+
+    def yielding(method):
+        async def call(self, *args, **kwargs):
+            result = await method(self, *args, **kwargs)
+            for _ in range(rng.randint(0, 3)):
+                await asyncio.sleep(0)
+            return result
+        return call
+
+    for name, method in inspect.getmembers(AsyncMongoMockCollection, inspect.iscoroutinefunction):
+        monkeypatch.setattr(AsyncMongoMockCollection, name, yielding(method))
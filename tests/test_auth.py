@@ -0,0 +1,77 @@
+import asyncio
+from collections import OrderedDict
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+
+
+@pytest.fixture
+def verified(monkeypatch):
+    """Empty the token cache and record every signature check."""
+    monkeypatch.setattr(auth, "_token_cache", OrderedDict())
+    calls = []
+    verify = auth._verify_token
+
+    def counting_verify(token):
+        calls.append(token)
+        return verify(token)
+
+    monkeypatch.setattr(auth, "_verify_token", counting_verify)
+    return calls
+
+
+def test_valid_tokens_are_verified_once(verified):
+    token = auth.create_access_token({"sub": "u"})
+    assert auth.decode_token(token)["sub"] == "u"
+    assert auth.decode_token(token)["sub"] == "u"
+    assert verified == [token]
+
+
+def test_cached_payloads_are_copies(verified):
+    token = auth.create_access_token({"sub": "u"})
+    auth.decode_token(token)["sub"] = "someone-else"
+    assert auth.decode_token(token)["sub"] == "u"
+
+
+def test_cached_tokens_are_rechecked_once_expired(verified, monkeypatch):
+    token = auth.create_access_token({"sub": "u"}, expires_delta=timedelta(minutes=5))
+    exp = auth.decode_token(token)["exp"]
+    monkeypatch.setattr(auth.time, "time", lambda: exp + 1)
+    auth.decode_token(token)
+    assert verified == [token, token]
+
+
+def test_expired_and_forged_tokens_are_rejected(verified):
+    expired = auth.create_access_token({"sub": "u"}, expires_delta=timedelta(seconds=-10))
+    forged = auth.jwt.encode({"sub": "u", "exp": 2 ** 40}, "not-the-secret", algorithm=auth.ALGORITHM)
+    for token in (expired, forged, "not-a-jwt"):
+        with pytest.raises(HTTPException) as error:
+            auth.decode_token(token)
+        assert error.value.status_code == 401
+    assert not auth._token_cache
+
+
+def test_token_cache_is_bounded(verified, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_CACHE_SIZE", 2)
+    tokens = [auth.create_access_token({"sub": f"u{n}"}) for n in range(3)]
+    for token in tokens:
+        auth.decode_token(token)
+    assert len(auth._token_cache) == 2
+    auth.decode_token(tokens[0])
+    assert verified == tokens + [tokens[0]]
+
+
+def test_password_hashing_sheds_load_past_the_queue(monkeypatch):
+    monkeypatch.setattr(auth, "_hash_waiting", auth.PASSWORD_HASH_WORKERS + auth.PASSWORD_HASH_MAX_QUEUE)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.verify_password_async("secret", "hash"))
+    assert error.value.status_code == 503
+
+
+def test_password_hashing_runs_off_the_event_loop():
+    hashed = asyncio.run(auth.get_password_hash_async("secret"))
+    assert asyncio.run(auth.verify_password_async("secret", hashed))
+    assert auth._hash_waiting == 0
@@ -0,0 +1,78 @@
+import asyncio
+
+import broker
+from broker import RedisBroker
+
+
+class FakePubSub:
+    def __init__(self, items):
+        self.items = items
+        self.patterns = []
+        self.closed = False
+
+    async def psubscribe(self, pattern: str):
+        self.patterns.append(pattern)
+
+    async def listen(self):
+        for item in self.items:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        # A live subscription blocks until there is something to read.
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.opened = []
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub(self.sessions.pop(0))
+        self.opened.append(pubsub)
+        return pubsub
+
+    async def aclose(self):
+        pass
+
+
+def pmessage(group_id: str, data: str) -> dict:
+    return {"type": "pmessage", "channel": (broker.CHANNEL_PREFIX + group_id).encode(), "data": data.encode()}
+
+
+def test_redis_broker_resubscribes_after_the_subscription_drops(monkeypatch):
+    monkeypatch.setattr(broker, "RECONNECT_BASE_SECONDS", 0.001)
+
+    async def main():
+        redis_broker = RedisBroker("redis://localhost:6379")
+        redis_broker.redis = FakeRedis([
+            [pmessage("g", "one"), ConnectionError("connection reset")],
+            [pmessage("g", "two")],
+        ])
+        delivered = []
+        reconnects = []
+
+        async def handler(group_id, payload):
+            delivered.append((group_id, payload))
+
+        async def on_reconnect():
+            reconnects.append(len(delivered))
+
+        await redis_broker.start(handler, on_reconnect=on_reconnect)
+        for _ in range(100):
+            if len(delivered) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await redis_broker.stop()
+
+        assert delivered == [("g", "one"), ("g", "two")]
+        assert reconnects == [1]
+        assert redis_broker.failures == 1
+        first, second = redis_broker.redis.opened
+        assert first.closed
+        assert second.patterns == [broker.CHANNEL_PREFIX + "*"]
+
+    asyncio.run(main())
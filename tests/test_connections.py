@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+from broker import MemoryBroker
+from connections import REPLACED_CLOSE_CODE, REVOKED_CLOSE_CODE, SLOW_CONSUMER_CLOSE_CODE, ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.accepted = False
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, payload: str):
+        if self.close_code is not None:
+            raise RuntimeError("socket closed")
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def run(test):
+    async def main():
+        manager = ConnectionManager(MemoryBroker())
+        await manager.start()
+        try:
+            await test(manager)
+        finally:
+            await manager.stop()
+    asyncio.run(main())
+
+
+async def settle():
+    # Let the writer tasks drain their queues.
+    await asyncio.sleep(0.01)
+
+
+def message(message_id: str, content: str = "hi") -> dict:
+    return {"id": message_id, "group_id": "g", "content": content}
+
+
+def test_broadcast_reaches_connected_members():
+    async def test(manager):
+        a, b = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(a, "g", "alice", members=["alice", "bob"])
+        await manager.connect(b, "g", "bob", members=["alice", "bob"])
+        await manager.broadcast("g", message("m1"))
+        await settle()
+        assert [m["id"] for m in a.sent] == ["m1"]
+        assert [m["id"] for m in b.sent] == ["m1"]
+    run(test)
+
+
+def test_replaced_connection_is_closed_and_its_disconnect_is_ignored():
+    async def test(manager):
+        old, new = FakeWebSocket(), FakeWebSocket()
+        first = await manager.connect(old, "g", "alice", members=["alice"])
+        second = await manager.connect(new, "g", "alice", members=["alice"])
+        await settle()
+        assert old.close_code == REPLACED_CLOSE_CODE
+
+        # The old handler notices its socket closed only now.
+        manager.disconnect(first)
+        assert manager.active_connections["g"]["alice"] is second
+        assert manager.is_member("g", "alice")
+
+        await manager.broadcast("g", message("m1"))
+        await settle()
+        assert [m["id"] for m in new.sent] == ["m1"]
+        assert old.sent == []
+    run(test)
+
+
+def test_reconnect_replays_missed_messages():
+    async def test(manager):
+        a, b = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(a, "g", "alice", members=["alice", "bob"])
+        first = await manager.connect(b, "g", "bob", members=["alice", "bob"])
+        await manager.broadcast("g", message("m1"))
+        await settle()
+        manager.disconnect(first)
+        await manager.broadcast("g", message("m2"))
+        await manager.broadcast("g", message("m3"))
+
+        again = FakeWebSocket()
+        await manager.connect(again, "g", "bob", members=["alice", "bob"], last_seen="m1")
+        await manager.broadcast("g", message("m4"))
+        await settle()
+        assert [m["id"] for m in again.sent] == ["m2", "m3", "m4"]
+    run(test)
+
+
+def test_disconnect_of_last_socket_drops_the_group_index():
+    async def test(manager):
+        connection = await manager.connect(FakeWebSocket(), "g", "alice", members=["alice", "bob"])
+        assert manager.is_member("g", "bob")
+        manager.disconnect(connection)
+        assert "g" not in manager.active_connections
+        assert not manager.is_member("g", "alice")
+
+        # Disconnecting twice is harmless.
+        manager.disconnect(connection)
+    run(test)
+
+
+def test_member_removed_revokes_the_socket():
+    async def test(manager):
+        a, b = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(a, "g", "alice", members=["alice", "bob"])
+        await manager.connect(b, "g", "bob", members=["alice", "bob"])
+        await manager.membership_changed("g", "bob", False)
+        await settle()
+        assert b.close_code == REVOKED_CLOSE_CODE
+        assert not manager.is_member("g", "bob")
+        assert "bob" not in manager.active_connections["g"]
+        assert a.close_code is None
+    run(test)
+
+
+def test_group_deleted_revokes_every_socket():
+    async def test(manager):
+        a, b = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(a, "g", "alice", members=["alice", "bob"])
+        await manager.connect(b, "g", "bob", members=["alice", "bob"])
+        await manager.group_deleted("g")
+        await settle()
+        assert a.close_code == REVOKED_CLOSE_CODE
+        assert b.close_code == REVOKED_CLOSE_CODE
+        assert "g" not in manager.active_connections
+    run(test)
+
+
+def test_removal_during_member_read_is_applied_on_connect():
+    async def test(manager):
+        mark = manager.control_mark()
+        members = ["alice", "bob", "carol"]  # read before the removals below
+        await manager.membership_changed("g", "carol", False)
+        await manager.membership_changed("g", "bob", False)
+
+        websocket = FakeWebSocket()
+        assert await manager.connect(websocket, "g", "bob", members=members, members_as_of=mark) is None
+        assert websocket.close_code == REVOKED_CLOSE_CODE
+
+        connection = await manager.connect(FakeWebSocket(), "g", "alice", members=members, members_as_of=mark)
+        assert connection is not None
+        assert manager.is_member("g", "alice")
+        assert not manager.is_member("g", "bob")
+        assert not manager.is_member("g", "carol")
+    run(test)
+
+
+def test_connect_refuses_when_the_control_log_has_wrapped():
+    async def test(manager):
+        mark = manager.control_mark()
+        manager.control_log = type(manager.control_log)(maxlen=2)
+        for user_id in ("x", "y", "z"):
+            await manager.membership_changed("other", user_id, True)
+
+        websocket = FakeWebSocket()
+        assert await manager.connect(websocket, "g", "alice", members=["alice"], members_as_of=mark) is None
+        assert websocket.close_code == SLOW_CONSUMER_CLOSE_CODE
+    run(test)
+
+
+def test_broker_reconnect_closes_every_socket_so_clients_catch_up():
+    async def test(manager):
+        a, b = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(a, "g", "alice", members=["alice"])
+        await manager.connect(b, "h", "bob", members=["bob"])
+        await manager.broker_reconnected()
+        await settle()
+        assert a.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert b.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert manager.active_connections == {}
+    run(test)
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from dashboard import dashboard_pipeline, dashboard_rows
+from models import TravelGroup
+from serialization import model_projection
+
+
+async def aggregate(db, collection: str, pipeline: list) -> list:
+    """Run `pipeline` on mongomock, which lacks $lookup sub-pipelines.
+
+    Each such $lookup is evaluated as MongoDB does: the sub-pipeline runs
+    over the foreign documents whose foreignField equals localField.
+    """
+    split = next((i for i, stage in enumerate(pipeline) if "$lookup" in stage), len(pipeline))
+    docs = await db[collection].aggregate(pipeline[:split]).to_list(None)
+    for stage in pipeline[split:]:
+        lookup = stage["$lookup"]
+        for doc in docs:
+            match = {"$match": {lookup["foreignField"]: doc.get(lookup["localField"])}}
+            doc[lookup["as"]] = await db[lookup["from"]].aggregate([match] + lookup["pipeline"]).to_list(None)
+    return docs
+
+
+def group(group_id: str, admin_id: str, age: int, last_seq: int = 0) -> dict:
+    return {"id": group_id, "admin_id": admin_id, "members": ["u", admin_id], "last_seq": last_seq,
+            "created_at": datetime.now(timezone.utc) - timedelta(minutes=age)}
+
+
+def test_every_lookup_is_keyed_on_a_group_id_index():
+    pipeline = dashboard_pipeline("u", 10, None, {"_id": 0})
+    lookups = {stage["$lookup"]["from"]: stage["$lookup"] for stage in pipeline if "$lookup" in stage}
+    assert sorted(lookups) == ["join_requests", "messages", "read_markers"]
+    assert all(lookup["foreignField"] == "group_id" for lookup in lookups.values())
+    # Counted only where the user is admin: the key is null elsewhere.
+    assert lookups["join_requests"]["localField"] == "admin_group_id"
+    assert {"$limit": 11} in pipeline
+    assert pipeline.index({"$limit": 11}) < min(pipeline.index({"$lookup": lookup}) for lookup in lookups.values())
+
+
+def test_dashboard_rows(db):
+    async def main():
+        await db.travel_groups.insert_many([
+            group("mine", "u", age=1, last_seq=7),
+            group("theirs", "x", age=2, last_seq=3),
+            group("older", "x", age=3),
+        ])
+        await db.join_requests.insert_many([
+            {"id": "r1", "group_id": "mine", "status": "pending"},
+            {"id": "r2", "group_id": "mine", "status": "approved"},
+            {"id": "r3", "group_id": "theirs", "status": "pending"},
+        ])
+        await db.read_markers.insert_one({"user_id": "u", "group_id": "mine", "last_read_seq": 5})
+        await db.messages.insert_many([
+            {"id": f"m{seq}", "group_id": "mine", "sender_id": "u", "sender_name": "U", "content": f"c{seq}",
+             "seq": seq, "created_at": datetime.now(timezone.utc) + timedelta(seconds=seq)}
+            for seq in (6, 7)
+        ])
+        pipeline = dashboard_pipeline("u", 2, None, model_projection(TravelGroup))
+        return dashboard_rows(await aggregate(db, "travel_groups", pipeline), "u", 2)
+
+    rows, next_cursor = asyncio.run(main())
+    assert next_cursor
+    mine, theirs = rows
+    assert [mine["group"]["id"], theirs["group"]["id"]] == ["mine", "theirs"]
+    assert (mine["pending_requests"], mine["message_count"], mine["unread_count"]) == (1, 7, 2)
+    assert mine["last_message"]["content"] == "c7"
+    assert "admin_group_id" not in mine["group"]
+    assert (theirs["pending_requests"], theirs["unread_count"], theirs["last_message"]) == (None, 3, None)
+
+
+def test_join_requests_are_not_looked_up_for_other_admins_groups(db):
+    async def main():
+        await db.travel_groups.insert_one(group("theirs", "x", age=1))
+        await db.join_requests.insert_one({"id": "r", "group_id": "theirs", "status": "pending"})
+        return await aggregate(db, "travel_groups", dashboard_pipeline("u", 10, None, {"_id": 0}))
+
+    doc, = asyncio.run(main())
+    assert doc["admin_group_id"] is None
+    assert sum(row["count"] for row in doc["pending"]) == 0
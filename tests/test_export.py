@@ -0,0 +1,56 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from codec import to_document
+from export import EXPORT_SETTLE_SECONDS, iter_ndjson, settle_cutoff
+from message_writer import FLUSH_DEADLINE_SECONDS
+from models import Message
+from serialization import ListSerializer
+
+
+def message(seq: int, age: float) -> dict:
+    return to_document(Message(group_id="g", sender_id="u", sender_name="U", content=f"m{seq}", seq=seq,
+                               created_at=datetime.now(timezone.utc) - timedelta(seconds=age)))
+
+
+def export(db, messages, after_seq=0, settled=True):
+    async def main():
+        if messages:
+            await db.messages.insert_many(messages)
+        chunks = iter_ndjson(db.messages, {"group_id": "g", "seq": {"$gt": after_seq}}, ListSerializer(Message),
+                             batch_size=2, after_seq=after_seq,
+                             settled_before=settle_cutoff() if settled else None)
+        return b"".join([chunk async for chunk in chunks])
+    return [json.loads(line)["seq"] for line in asyncio.run(main()).splitlines()]
+
+
+def test_settle_window_covers_the_writer_deadline():
+    assert EXPORT_SETTLE_SECONDS > FLUSH_DEADLINE_SECONDS
+
+
+def test_export_follows_seq_order_not_timestamps(db):
+    # seq 2 was stamped later than seq 3 by a worker with a fast clock.
+    assert export(db, [message(3, 2), message(1, 3), message(2, 1)], settled=False) == [1, 2, 3]
+
+
+def test_export_runs_up_to_the_latest_contiguous_seq(db):
+    assert export(db, [message(1, 5), message(2, 1), message(3, 0)]) == [1, 2, 3]
+    assert export(db, [], after_seq=1) == [2, 3]
+
+
+def test_export_stops_at_a_gap_the_writer_may_still_fill(db):
+    # seq 3 was allocated but is still being retried by another worker.
+    recent = [message(1, 5), message(2, 4), message(4, 1), message(5, 0)]
+    assert export(db, recent) == [1, 2]
+
+
+def test_export_stops_at_a_gap_right_after_the_sync_point(db):
+    assert export(db, [message(1, 5), message(3, 1)], after_seq=0) == [1]
+    assert export(db, [], after_seq=1) == []
+
+
+def test_export_skips_gaps_older_than_the_writer_deadline(db):
+    old = EXPORT_SETTLE_SECONDS + 10
+    # seq 2 was dropped by the writer long ago; it can never land now.
+    assert export(db, [message(1, old + 5), message(3, old), message(4, 1)]) == [1, 3, 4]
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import group_deletion
+from group_deletion import GroupDeletionWorker, schedule_group_deletion
+from message_writer import MessageWriter
+from read_state import ReadMarkerWriter
+
+
+async def seed(db):
+    await db.travel_groups.insert_many([{"id": "g", "admin_id": "a"}, {"id": "h", "admin_id": "a"}])
+    await db.messages.insert_many([{"id": f"m{n}", "group_id": "g", "seq": n} for n in range(3)])
+    await db.read_markers.insert_one({"user_id": "u", "group_id": "g", "last_read_seq": 2})
+    await db.join_requests.insert_one({"id": "r", "group_id": "g", "status": "pending"})
+
+
+def test_cascade_waits_for_buffered_writes_to_land(db, monkeypatch):
+    async def main():
+        await seed(db)
+        job = await schedule_group_deletion(db, {"id": "g", "admin_id": "a"})
+        worker = GroupDeletionWorker(db)
+        assert not await worker.run_next()
+        assert await db.messages.count_documents({"group_id": "g"}) == 3
+
+        await db.group_deletions.update_one(
+            {"id": job["id"]}, {"$set": {"not_before": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        assert await worker.run_next()
+        return await db.group_deletions.find_one({"id": job["id"]})
+
+    job = asyncio.run(main())
+    assert job["status"] == "done"
+    assert job["deleted"] == {"join_requests": 1, "messages": 3, "read_markers": 1}
+
+
+def test_jobs_without_not_before_are_claimed(db):
+    async def main():
+        await seed(db)
+        job = await schedule_group_deletion(db, {"id": "g", "admin_id": "a"})
+        await db.group_deletions.update_one({"id": job["id"]}, {"$unset": {"not_before": ""}})
+        return await GroupDeletionWorker(db).run_next()
+
+    assert asyncio.run(main())
+
+
+def test_writers_discard_queued_writes_for_a_deleted_group(db):
+    now = datetime.now(timezone.utc)
+    messages = MessageWriter(db.messages, durable=False)
+    markers = ReadMarkerWriter(db)
+
+    async def main():
+        for group_id in ("g", "h"):
+            await messages.write({"id": f"new-{group_id}", "group_id": group_id, "created_at": now})
+            markers.mark("u", group_id, 5)
+        messages.discard_group("g")
+        markers.discard_group("g")
+        await messages.flush()
+        await markers.flush()
+
+    asyncio.run(main())
+    assert [doc["group_id"] for doc in messages.pending] == []
+    assert asyncio.run(db.messages.count_documents({})) == 1
+    assert markers.pending == {}
+
+
+def test_read_markers_are_not_recreated_for_a_deleted_group(db):
+    markers = ReadMarkerWriter(db)
+
+    async def main():
+        await seed(db)
+        markers.mark("u", "g", 3)
+        markers.mark("u", "h", 1)
+        await schedule_group_deletion(db, {"id": "g", "admin_id": "a"})
+        await db.read_markers.delete_many({"group_id": "g"})
+        await markers.flush()
+        return await db.read_markers.find({}, {"_id": 0, "group_id": 1, "last_read_seq": 1}).to_list(None)
+
+    assert asyncio.run(main()) == [{"group_id": "h", "last_read_seq": 1}]
+
+
+def test_cascade_delay_covers_the_message_deadline():
+    assert group_deletion.CASCADE_DELAY_SECONDS > group_deletion.FLUSH_DEADLINE_SECONDS
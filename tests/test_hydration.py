@@ -0,0 +1,37 @@
+import asyncio
+
+from hydration import PUBLIC_PROFILE_FIELDS, attach_users, fetch_users
+
+
+def seed_users(db, *user_ids):
+    users = [{"id": user_id, "name": user_id.upper(), "email": f"{user_id}@example.com", "city": "Pune", "age": 30,
+              "average_rating": 4.0, "total_ratings": 1, "rating_sum": 4, "password": "hash"}
+             for user_id in user_ids]
+    asyncio.run(db.users.insert_many(users))
+
+
+def test_fetch_users_is_keyed_by_id_and_public_only(db):
+    seed_users(db, "a", "b", "c")
+    users = asyncio.run(fetch_users(db, ["c", "a", "c", "missing"]))
+    assert sorted(users) == ["a", "c"]
+    assert set(users["a"]) == set(PUBLIC_PROFILE_FIELDS)
+
+
+def test_fetch_users_with_all_fields_leaves_out_private_ones(db):
+    seed_users(db, "a")
+    user = asyncio.run(fetch_users(db, ["a"], fields=None))["a"]
+    assert user["email"] == "a@example.com"
+    assert "password" not in user and "rating_sum" not in user
+
+
+def test_fetch_users_without_ids_skips_the_query(db):
+    assert asyncio.run(fetch_users(db, [])) == {}
+
+
+def test_attach_users_keeps_row_order_and_drops_missing_users(db):
+    # Inserted in a different order from the rows.
+    seed_users(db, "b", "c", "a")
+    rows = [{"id": "r1", "user_id": "c"}, {"id": "r2", "user_id": "gone"},
+            {"id": "r3", "user_id": "a"}, {"id": "r4", "user_id": "c"}]
+    attached = asyncio.run(attach_users(db, rows, "user_id", "request", "user"))
+    assert [(row["request"]["id"], row["user"]["name"]) for row in attached] == [("r1", "C"), ("r3", "A"), ("r4", "C")]
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timezone
+
+import mongomock
+import pytest
+from pymongo.errors import OperationFailure
+
+import indexes
+from ratings import UNIQUE_RATING_KEYS, make_ratings_unique
+
+RATING_INDEX = "from_user_id_1_to_user_id_1_group_id_1"
+
+
+@pytest.fixture
+def option_conflict_code(monkeypatch):
+    """Give mongomock's option-conflict error MongoDB's code (85)."""
+    create_index = mongomock.collection.Collection.create_index
+
+    def create_index_with_code(self, *args, **kwargs):
+        try:
+            return create_index(self, *args, **kwargs)
+        except OperationFailure as e:
+            if e.code is None and "different options" in str(e):
+                raise OperationFailure(str(e), code=indexes.INDEX_OPTIONS_CONFLICT)
+            raise
+
+    monkeypatch.setattr(mongomock.collection.Collection, "create_index", create_index_with_code)
+
+
+def rating(rating_id: str, stars: int) -> dict:
+    return {"id": rating_id, "from_user_id": "a", "to_user_id": "b", "group_id": "g", "stars": stars,
+            "created_at": datetime.now(timezone.utc)}
+
+
+def test_ratings_are_unique_per_rater_ratee_and_trip(db):
+    asyncio.run(indexes.ensure_indexes(db))
+    info = asyncio.run(db.ratings.index_information())
+    assert info[RATING_INDEX]["unique"] is True
+
+
+def test_startup_refuses_an_index_with_changed_options(db, option_conflict_code):
+    asyncio.run(db.ratings.create_index(UNIQUE_RATING_KEYS, name=RATING_INDEX))
+    with pytest.raises(RuntimeError, match="python ratings.py"):
+        asyncio.run(indexes.ensure_indexes(db))
+    # Startup never drops anything.
+    info = asyncio.run(db.ratings.index_information())
+    assert "unique" not in info[RATING_INDEX]
+
+
+def test_migration_removes_duplicates_and_rebuilds_the_index(db, option_conflict_code):
+    async def main():
+        await db.ratings.create_index(UNIQUE_RATING_KEYS, name=RATING_INDEX)
+        await db.ratings.insert_many([rating("first", 5), rating("second", 1)])
+        assert await make_ratings_unique(db)
+        assert not await make_ratings_unique(db)
+        await indexes.ensure_indexes(db)
+        return [r["id"] async for r in db.ratings.find()], await db.ratings.index_information()
+
+    ids, info = asyncio.run(main())
+    assert ids == ["first"]
+    assert info[RATING_INDEX]["unique"] is True
+
+
+def test_other_index_errors_are_raised(db, monkeypatch):
+    def create_index(self, *args, **kwargs):
+        raise OperationFailure("not authorized", code=13)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "create_index", create_index)
+    with pytest.raises(OperationFailure):
+        asyncio.run(indexes.ensure_indexes(db))
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from membership import add_member, backfill_member_counts, remove_member
+
+
+def create_group(db, members=("admin",), max_members=3):
+    group = {"id": "g", "admin_id": "admin", "members": list(members), "member_count": len(members),
+             "max_members": max_members}
+    asyncio.run(db.travel_groups.insert_one(group))
+
+
+def stored_group(db) -> dict:
+    return asyncio.run(db.travel_groups.find_one({"id": "g"}, {"_id": 0}))
+
+
+def test_parallel_approvals_never_overfill_a_group(db, interleaved):
+    create_group(db, members=("admin", "a"), max_members=3)
+
+    async def approve(user_id):
+        try:
+            await add_member(db, "g", "admin", user_id)
+            return True
+        except HTTPException as e:
+            assert e.detail == "Group is full"
+            return False
+
+    async def main():
+        return await asyncio.gather(*(approve(f"user-{n}") for n in range(20)))
+
+    assert sum(asyncio.run(main())) == 1
+    group = stored_group(db)
+    assert len(group["members"]) <= group["max_members"]
+    assert group["member_count"] == len(group["members"]) == 3
+
+
+def test_parallel_joins_and_leaves_keep_member_count(db, interleaved):
+    create_group(db, members=("admin", "a", "b", "c"), max_members=6)
+
+    async def main():
+        await asyncio.gather(
+            *(remove_member(db, "g", user_id) for user_id in ("a", "b", "c")),
+            *(add_member(db, "g", "admin", f"user-{n}") for n in range(2)),
+            return_exceptions=True,
+        )
+
+    asyncio.run(main())
+    group = stored_group(db)
+    assert len(group["members"]) <= group["max_members"]
+    assert group["member_count"] == len(group["members"])
+
+
+def test_approving_an_existing_member_is_a_no_op(db):
+    create_group(db, members=("admin", "a"))
+    asyncio.run(add_member(db, "g", "admin", "a"))
+    assert stored_group(db)["member_count"] == 2
+
+
+def test_membership_errors(db):
+    create_group(db, members=("admin", "a"), max_members=2)
+    cases = [
+        (add_member(db, "g", "a", "b"), 403),
+        (add_member(db, "g", "admin", "b"), 400),
+        (remove_member(db, "g", "admin"), 400),
+        (remove_member(db, "g", "b"), 400),
+        (remove_member(db, "missing", "a"), 404),
+    ]
+    for call, status_code in cases:
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(call)
+        assert error.value.status_code == status_code
+
+
+def test_backfill_sets_member_count(db):
+    asyncio.run(db.travel_groups.insert_one({"id": "old", "members": ["a", "b"]}))
+    asyncio.run(backfill_member_counts(db))
+    assert asyncio.run(db.travel_groups.find_one({"id": "old"}))["member_count"] == 2
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import message_writer
+from message_writer import MessageWriter
+
+
+class FakeCollection:
+    """Stores documents by id; `failures` lists what each insert_many call does."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.stored = {}
+        self.calls = 0
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        failure = self.failures.pop(0) if self.failures else None
+        if isinstance(failure, Exception):
+            raise failure
+        write_errors = []
+        for index, doc in enumerate(docs):
+            if doc["id"] in self.stored:
+                write_errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            elif failure and index in failure:
+                write_errors.append({"index": index, "code": 2, "errmsg": "bad value"})
+            else:
+                self.stored[doc["id"]] = doc
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors, "writeConcernErrors": [], "nInserted": 0})
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(message_writer, "FLUSH_RETRY_SECONDS", 0.001)
+
+
+def docs(count: int, age: float = 0) -> list:
+    created_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return [{"id": f"m{n}", "created_at": created_at} for n in range(count)]
+
+
+def write_all(writer: MessageWriter, batch: list):
+    async def main():
+        for doc in batch:
+            await writer.write(doc)
+        await writer.flush()
+    asyncio.run(main())
+
+
+def test_failed_batch_is_retried():
+    collection = FakeCollection([ConnectionError("primary stepped down")])
+    writer = MessageWriter(collection, durable=False)
+    write_all(writer, docs(3))
+    assert sorted(collection.stored) == ["m0", "m1", "m2"]
+    assert writer.retried == 3
+    assert writer.dropped == 0
+    assert writer.attempts == {}
+
+
+def test_partial_failure_retries_only_the_documents_not_stored():
+    collection = FakeCollection([{1}])
+    writer = MessageWriter(collection, durable=False)
+    write_all(writer, docs(3))
+    assert sorted(collection.stored) == ["m0", "m1", "m2"]
+    assert writer.retried == 1
+    assert collection.calls == 2
+
+
+def test_duplicate_key_on_retry_counts_as_stored():
+    collection = FakeCollection()
+    collection.stored["m0"] = {"id": "m0"}
+    writer = MessageWriter(collection, durable=False)
+    write_all(writer, docs(2))
+    assert writer.retried == 0
+    assert collection.calls == 1
+
+
+def test_messages_are_dropped_after_the_last_attempt():
+    attempts = message_writer.FLUSH_MAX_ATTEMPTS
+    collection = FakeCollection([ConnectionError("down")] * attempts)
+    writer = MessageWriter(collection, durable=False)
+    write_all(writer, docs(2))
+    assert collection.stored == {}
+    assert collection.calls == attempts
+    assert writer.dropped == 2
+    assert writer.pending == []
+    assert writer.attempts == {}
+
+
+def test_durable_writes_wait_for_the_retry():
+    collection = FakeCollection([ConnectionError("down")])
+    writer = MessageWriter(collection, durable=True)
+
+    async def main():
+        await writer.start()
+        await asyncio.wait_for(asyncio.gather(*(writer.write(doc) for doc in docs(2))), 1)
+        await writer.stop()
+
+    asyncio.run(main())
+    assert sorted(collection.stored) == ["m0", "m1"]
+
+
+def test_messages_past_the_deadline_are_dropped_not_inserted():
+    collection = FakeCollection()
+    writer = MessageWriter(collection, durable=False)
+    deadline = message_writer.FLUSH_DEADLINE_SECONDS
+    write_all(writer, docs(2, age=deadline + 1) + [{"id": "fresh", "created_at": datetime.now(timezone.utc)}])
+    assert sorted(collection.stored) == ["fresh"]
+    assert writer.dropped == 2
+
+
+def test_retries_stop_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(message_writer, "FLUSH_DEADLINE_SECONDS", 0.05)
+    monkeypatch.setattr(message_writer, "FLUSH_RETRY_SECONDS", 0.03)
+    collection = FakeCollection([ConnectionError("down")] * message_writer.FLUSH_MAX_ATTEMPTS)
+    writer = MessageWriter(collection, durable=True)
+
+    async def main():
+        await writer.start()
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(writer.write(docs(1)[0]), 1)
+        await writer.stop()
+
+    asyncio.run(main())
+    assert collection.stored == {}
+    assert collection.calls < message_writer.FLUSH_MAX_ATTEMPTS
+    assert writer.dropped == 1
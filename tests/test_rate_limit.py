@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import rate_limit
+from rate_limit import MemoryRateLimitBackend, RateLimiter, parse_rule
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0]))
+    return now
+
+
+class BrokenBackend:
+    async def take(self, key, capacity, rate):
+        raise ConnectionError("redis is down")
+
+
+def test_parse_rule():
+    assert parse_rule("10/60") == (10.0, 10 / 60)
+    assert parse_rule("off") is parse_rule("") is parse_rule("0") is None
+
+
+def test_buckets_refill_over_time(clock):
+    backend = MemoryRateLimitBackend()
+
+    async def take(key="k"):
+        return await backend.take(key, 2, 1.0)
+
+    async def main():
+        assert [await take(), await take()] == [0.0, 0.0]
+        assert await take() == pytest.approx(1.0)
+        assert await take("other") == 0.0
+        clock[0] += 0.5
+        # The rejected request took nothing, so half a token is left.
+        assert await take() == pytest.approx(0.5)
+        clock[0] += 10
+        assert [await take(), await take()] == [0.0, 0.0]
+
+    asyncio.run(main())
+
+
+def test_idle_buckets_are_evicted_first(clock):
+    backend = MemoryRateLimitBackend(maxsize=2)
+
+    async def main():
+        for key in ("a", "b", "a", "c"):
+            await backend.take(key, 1, 1.0)
+
+    asyncio.run(main())
+    assert list(backend.buckets) == ["a", "c"]
+
+
+def test_check_raises_429_with_retry_after(clock):
+    limiter = RateLimiter(MemoryRateLimitBackend(), {"login": parse_rule("2/60"), "signup": None})
+
+    async def main():
+        await limiter.check("login", "1.2.3.4")
+        await limiter.check("login", "1.2.3.4")
+        for _ in range(5):
+            await limiter.check("signup", "1.2.3.4")
+        with pytest.raises(HTTPException) as error:
+            await limiter.check("login", "1.2.3.4")
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "30"
+    assert limiter.stats()["allowed"]["login"] == 2
+    assert limiter.stats()["rejected"]["login"] == 1
+
+
+def test_backend_errors_let_requests_through():
+    limiter = RateLimiter(BrokenBackend(), {"login": parse_rule("1/60")})
+
+    async def main():
+        for _ in range(3):
+            await limiter.check("login", "1.2.3.4")
+
+    asyncio.run(main())
+    assert limiter.backend_errors == 3
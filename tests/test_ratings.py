@@ -0,0 +1,41 @@
+import asyncio
+
+from ratings import apply_rating, recompute_rating_aggregates
+
+
+def test_concurrent_ratings_keep_a_consistent_average(db, interleaved):
+    stars = [5, 1, 4, 2, 3, 5, 5, 1, 2, 4] * 3
+
+    async def main():
+        await db.users.insert_one({"id": "u", "rating_sum": 0, "total_ratings": 0, "average_rating": 0.0})
+        await asyncio.gather(*(apply_rating(db, "u", n) for n in stars))
+        return await db.users.find_one({"id": "u"}, {"_id": 0})
+
+    user = asyncio.run(main())
+    assert user["rating_sum"] == sum(stars)
+    assert user["total_ratings"] == len(stars)
+    # Whichever update wrote the average last saw the final sum and count.
+    assert user["average_rating"] == sum(stars) / len(stars)
+
+
+def test_rating_a_missing_user_is_ignored(db):
+    asyncio.run(apply_rating(db, "missing", 5))
+    assert asyncio.run(db.users.count_documents({})) == 0
+
+
+def test_recompute_rebuilds_and_resets_aggregates(db):
+    async def main():
+        await db.users.insert_many([
+            {"id": "rated", "rating_sum": 1, "total_ratings": 1, "average_rating": 1.0},
+            {"id": "stale", "rating_sum": 9, "total_ratings": 2, "average_rating": 4.5},
+        ])
+        await db.ratings.insert_many([
+            {"id": "r1", "from_user_id": "a", "to_user_id": "rated", "group_id": "g", "stars": 5},
+            {"id": "r2", "from_user_id": "b", "to_user_id": "rated", "group_id": "g", "stars": 2},
+        ])
+        assert await recompute_rating_aggregates(db) == 1
+        return {u["id"]: u async for u in db.users.find({}, {"_id": 0})}
+
+    users = asyncio.run(main())
+    assert (users["rated"]["rating_sum"], users["rated"]["total_ratings"], users["rated"]["average_rating"]) == (7, 2, 3.5)
+    assert (users["stale"]["rating_sum"], users["stale"]["total_ratings"], users["stale"]["average_rating"]) == (0, 0, 0.0)
@@ -0,0 +1,80 @@
+import asyncio
+
+from read_state import MemorySeqBackend, ReadMarkerWriter, SeqAllocator, unread_count
+
+
+def seed_groups(db, groups: dict, newest: dict = None):
+    async def main():
+        for group_id, last_seq in groups.items():
+            await db.travel_groups.insert_one({"id": group_id, "last_seq": last_seq})
+        for group_id, seq in (newest or {}).items():
+            await db.messages.insert_one({"id": f"{group_id}-{seq}", "group_id": group_id, "seq": seq})
+    asyncio.run(main())
+
+
+def test_seqs_continue_from_the_stored_counter(db):
+    seed_groups(db, {"g": 7})
+
+    async def main():
+        allocator = SeqAllocator(db, MemorySeqBackend())
+        assert [await allocator.next_seq("g") for _ in range(3)] == [8, 9, 10]
+        assert await allocator.last_seq("g") == 10
+    asyncio.run(main())
+
+
+def test_seed_covers_messages_stored_past_last_seq(db):
+    seed_groups(db, {"g": 3}, newest={"g": 5})
+
+    async def main():
+        allocator = SeqAllocator(db, MemorySeqBackend())
+        assert await allocator.next_seq("g") == 6
+    asyncio.run(main())
+
+
+def test_unknown_group_gets_no_seq(db):
+    async def main():
+        allocator = SeqAllocator(db, MemorySeqBackend())
+        assert await allocator.next_seq("missing") is None
+        assert await allocator.last_seq("missing") == 0
+    asyncio.run(main())
+
+
+def test_concurrent_first_allocations_are_distinct(db):
+    seed_groups(db, {"g": 0})
+
+    async def main():
+        allocator = SeqAllocator(db, MemorySeqBackend())
+        seqs = await asyncio.gather(*(allocator.next_seq("g") for _ in range(10)))
+        assert sorted(seqs) == list(range(1, 11))
+    asyncio.run(main())
+
+
+def test_flush_writes_the_highest_seq_per_group(db):
+    seed_groups(db, {"g": 0, "h": 2})
+
+    async def main():
+        allocator = SeqAllocator(db, MemorySeqBackend())
+        for _ in range(3):
+            await allocator.next_seq("g")
+        await allocator.next_seq("h")
+        await allocator.flush()
+        assert allocator.pending == {}
+        return {g["id"]: g["last_seq"] async for g in db.travel_groups.find()}
+
+    assert asyncio.run(main()) == {"g": 3, "h": 3}
+
+
+def test_read_markers_keep_the_highest_seq(db):
+    seed_groups(db, {"g": 8})
+    writer = ReadMarkerWriter(db)
+    writer.mark("u", "g", 5)
+    writer.mark("u", "g", 3)
+    assert writer.pending == {("u", "g"): 5}
+    assert asyncio.run(writer.last_read_seq("u", "g")) == 5
+
+    asyncio.run(writer.flush())
+    writer.mark("u", "g", 4)
+    asyncio.run(writer.flush())
+    assert asyncio.run(writer.last_read_seq("u", "g")) == 5
+    assert unread_count(8, 5) == 3
+    assert unread_count(4, 5) == 0
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+import response_cache
+from response_cache import MemoryCacheBackend, ResponseCache, group_key
+
+
+def request(if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def counting_build(body: bytes = b'{"id": "g"}'):
+    calls = []
+
+    async def build():
+        calls.append(body)
+        return body, {"X-Total-Count": "1"}
+
+    return build, calls
+
+
+def test_hits_skip_build_and_matching_etags_get_a_304():
+    cache = ResponseCache(MemoryCacheBackend())
+    build, calls = counting_build()
+
+    async def main():
+        first = await cache.respond(request(), group_key("g"), build)
+        second = await cache.respond(request(), group_key("g"), build)
+        revalidated = await cache.respond(request(first.headers["etag"]), group_key("g"), build)
+        return first, second, revalidated
+
+    first, second, revalidated = asyncio.run(main())
+    assert len(calls) == 1 and (cache.hits, cache.misses) == (2, 1)
+    assert first.body == second.body == b'{"id": "g"}'
+    assert first.headers["etag"] == second.headers["etag"]
+    assert second.headers["x-total-count"] == "1"
+    assert revalidated.status_code == 304 and revalidated.body == b""
+
+
+def test_invalidating_a_group_rebuilds_it_and_its_searches():
+    cache = ResponseCache(MemoryCacheBackend())
+    build, calls = counting_build()
+
+    async def main():
+        search_key = await cache.search_key({"destination": "goa"})
+        await cache.respond(request(), group_key("g"), build)
+        await cache.respond(request(), search_key, build)
+        await cache.invalidate_group("g")
+        assert await cache.search_key({"destination": "goa"}) != search_key
+        await cache.respond(request(), group_key("g"), build)
+
+    asyncio.run(main())
+    assert len(calls) == 3
+
+
+def test_search_keys_ignore_parameter_order():
+    cache = ResponseCache(MemoryCacheBackend())
+
+    async def main():
+        return (await cache.search_key({"a": 1, "b": 2}), await cache.search_key({"b": 2, "a": 1}),
+                await cache.search_key({"a": 1, "b": 3}))
+
+    first, reordered, other = asyncio.run(main())
+    assert first == reordered != other
+
+
+def test_memory_backend_expires_and_evicts(monkeypatch):
+    backend = MemoryCacheBackend(maxsize=2)
+    now = [100.0]
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+
+    async def main():
+        await backend.set("a", b"1", ttl=10)
+        await backend.set("b", b"2", ttl=10)
+        await backend.get("a")
+        await backend.set("c", b"3", ttl=10)
+        assert list(backend.entries) == ["a", "c"]
+        now[0] += 10
+        assert await backend.get("a") is None
+
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+import asyncio
+import re
+
+import search
+from search import LocationVocabulary, build_search_query, location_tokens, search_fields
+
+
+async def create_group(db, locations, group_id, to_location, from_location="Delhi"):
+    doc = {"id": group_id, "from_location": from_location, "to_location": to_location}
+    doc.update(search_fields(from_location, to_location))
+    await db.travel_groups.insert_one(doc)
+    if locations:
+        await locations.record(doc)
+
+
+async def search_ids(db, locations, **filters):
+    vocabulary = locations if await locations.is_current() else None
+    query = build_search_query(vocabulary=vocabulary, **filters)
+    return sorted([g["id"] async for g in db.travel_groups.find(query)])
+
+
+def vocabulary(db, *destinations) -> LocationVocabulary:
+    async def load():
+        for i, name in enumerate(destinations):
+            await create_group(db, None, f"g{i}", name)
+        locations = LocationVocabulary(db)
+        await locations.refresh()
+        return locations
+    return asyncio.run(load())
+
+
+def test_location_tokens_are_normalized():
+    assert location_tokens("Manāli, Himachal  Pradesh") == ["manali", "himachal", "pradesh"]
+
+
+def test_non_latin_locations_have_tokens():
+    assert location_tokens("मनाली, हिमाचल") == ["मनाली", "हिमाचल"]
+    assert location_tokens("Straße") == ["strasse"]
+
+
+def test_non_latin_locations_are_found(db):
+    locations = vocabulary(db, "मनाली", "Manali")
+    assert asyncio.run(search_ids(db, locations, to_location="मना")) == ["g0"]
+
+
+def test_prefix_expands_to_known_tokens(db):
+    locations = vocabulary(db, "Manali", "Mandi", "Mumbai", "Goa")
+    assert locations.expand("to_tokens", "man") == ["manali", "mandi"]
+    assert build_search_query(to_location="Man", vocabulary=locations) == {
+        "$and": [{"to_tokens": {"$in": ["manali", "mandi"]}}]
+    }
+
+
+def test_unknown_or_broad_prefix_falls_back_to_regex(db, monkeypatch):
+    locations = vocabulary(db, "Manali", "Mandi")
+    assert locations.expand("to_tokens", "zan") is None
+
+    monkeypatch.setattr(search, "MAX_PREFIX_TOKENS", 1)
+    assert locations.expand("to_tokens", "man") is None
+    query = build_search_query(to_location="man", vocabulary=locations)
+    assert query == {"$and": [{"to_tokens": re.compile("^man")}]}
+
+
+def test_groups_written_by_this_worker_are_added(db):
+    locations = vocabulary(db, "Goa")
+
+    async def scenario():
+        await create_group(db, locations, "g1", "Zanskar", from_location="Leh")
+        return await locations.is_current()
+
+    assert asyncio.run(scenario())
+    assert locations.expand("to_tokens", "zan") == ["zanskar"]
+    assert locations.expand("from_tokens", "le") == ["leh"]
+    assert locations.tokens["to_tokens"] == ["goa", "zanskar"]
+
+
+def test_groups_written_by_another_worker_are_not_missed(db):
+    worker_1 = vocabulary(db, "Manali")
+    worker_2 = LocationVocabulary(db)
+
+    async def scenario():
+        await worker_2.refresh()
+        await create_group(db, worker_2, "g1", "Mandi")
+        # worker_1 still only knows "manali"; it must not answer from that.
+        assert not await worker_1.is_current()
+        found = await search_ids(db, worker_1, to_location="man")
+        await worker_1.refresh()
+        assert await worker_1.is_current()
+        return found, await search_ids(db, worker_1, to_location="man")
+
+    before_reload, after_reload = asyncio.run(scenario())
+    assert before_reload == ["g0", "g1"]
+    assert after_reload == ["g0", "g1"]
+    assert worker_1.expand("to_tokens", "man") == ["manali", "mandi"]
+
+
+def test_each_word_is_its_own_clause(db):
+    locations = vocabulary(db, "New Delhi", "Newark")
+    assert build_search_query(to_location="new del", vocabulary=locations) == {
+        "$and": [{"to_tokens": {"$in": ["new", "newark"]}}, {"to_tokens": {"$in": ["delhi"]}}]
+    }
@@ -0,0 +1,53 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from codec import to_document
+from models import Message, TravelGroup, User
+from serialization import ListSerializer
+from user_cache import UserCache
+
+
+def legacy_group() -> dict:
+    group = to_document(TravelGroup(from_location="Delhi", to_location="Manali",
+                                    travel_date=datetime(2027, 1, 5, tzinfo=timezone.utc), budget_min=100,
+                                    budget_max=500, trip_type="adventure", description="d", max_members=5,
+                                    admin_id="a", members=["a"]))
+    # Stored before member_count and last_seq existed.
+    del group["member_count"], group["last_seq"]
+    return group
+
+
+def both_modes(model, docs) -> tuple:
+    validated = ListSerializer(model, fast=False)
+    fast = ListSerializer(model, fast=True)
+    return json.loads(validated.dump(docs)), json.loads(fast.dump(docs))
+
+
+def test_fast_mode_fills_defaults_for_legacy_documents():
+    validated, fast = both_modes(TravelGroup, [legacy_group()])
+    assert fast == validated
+    assert fast[0]["member_count"] == 0 and fast[0]["last_seq"] == 0
+
+
+def test_fast_mode_matches_validation_for_messages():
+    message = to_document(Message(group_id="g", sender_id="u", sender_name="U", content="hi"))
+    del message["seq"]
+    validated, fast = both_modes(Message, [message])
+    assert fast == validated
+    serializer = ListSerializer(Message, fast=True)
+    assert json.loads(serializer.dump_lines([message]))["seq"] == 0
+
+
+def test_fast_mode_does_not_copy_complete_documents():
+    group = {**legacy_group(), "member_count": 1, "last_seq": 3}
+    assert ListSerializer(TravelGroup, fast=True)._with_defaults(group) is group
+
+
+def test_cached_profiles_leave_out_private_fields(db):
+    user = to_document(User(name="A", email="a@example.com", city="Pune", age=30))
+    user.update(password="hash", rating_sum=9, total_ratings=2, average_rating=4.5)
+    asyncio.run(db.users.insert_one(user))
+    profile = asyncio.run(UserCache().get(db, user["id"]))
+    assert "password" not in profile and "rating_sum" not in profile
+    assert profile["average_rating"] == 4.5
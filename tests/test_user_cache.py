@@ -0,0 +1,71 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockCollection
+
+from user_cache import UserCache
+
+
+def seed_users(db, *user_ids):
+    asyncio.run(db.users.insert_many([{"id": user_id, "name": user_id, "password": "hash"} for user_id in user_ids]))
+
+
+def test_profiles_are_cached_until_invalidated(db):
+    seed_users(db, "a")
+    cache = UserCache()
+
+    async def main():
+        assert (await cache.get(db, "a"))["name"] == "a"
+        await db.users.update_one({"id": "a"}, {"$set": {"name": "renamed"}})
+        assert (await cache.get(db, "a"))["name"] == "a"
+        cache.invalidate("a")
+        assert (await cache.get(db, "a"))["name"] == "renamed"
+
+    asyncio.run(main())
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_callers_get_copies(db):
+    seed_users(db, "a")
+    cache = UserCache()
+    asyncio.run(cache.get(db, "a"))["name"] = "mutated"
+    assert asyncio.run(cache.get(db, "a"))["name"] == "a"
+
+
+def test_expired_and_evicted_entries_are_reloaded(db):
+    seed_users(db, "a", "b", "c")
+
+    expired = UserCache(ttl=0)
+    asyncio.run(expired.get(db, "a"))
+    asyncio.run(expired.get(db, "a"))
+    assert expired.misses == 2
+
+    lru = UserCache(maxsize=2)
+    for user_id in ("a", "b", "a", "c"):
+        asyncio.run(lru.get(db, user_id))
+    assert list(lru.entries) == ["a", "c"]
+
+
+def test_lookup_racing_an_invalidation_is_not_cached(db, monkeypatch):
+    seed_users(db, "a")
+    cache = UserCache()
+    find_one = AsyncMongoMockCollection.find_one
+    release = None
+
+    async def slow_find_one(self, *args, **kwargs):
+        result = await find_one(self, *args, **kwargs)
+        await release.wait()
+        return result
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        monkeypatch.setattr(AsyncMongoMockCollection, "find_one", slow_find_one)
+        lookup = asyncio.create_task(cache.get(db, "a"))
+        await asyncio.sleep(0)
+        # The profile changes while the lookup holds the old document.
+        cache.invalidate("a")
+        release.set()
+        return await lookup
+
+    assert asyncio.run(main())["name"] == "a"
+    assert "a" not in cache.entries